@@ -0,0 +1,251 @@
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from . import models
+from .crud import (
+    create_road_network_from_edges,
+    get_road_network_by_name,
+    update_road_network,
+    update_road_network_version,
+)
+from .database import DATABASE_URL
+from .utils import (
+    extract_network_info,
+    file_digest,
+    geojson_to_road_edges,
+    load_geojson_file,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(version: str) -> tuple[int, ...]:
+    return tuple(int(part) for part in version.split("."))
+
+
+def plan_imports(paths: list[str]) -> dict[str, list[tuple[str, str]]]:
+    """Group network files by name, each name's versions in ascending order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "road_network_*.geojson")))
+        else:
+            files.append(path)
+
+    plan = {}
+    for path in files:
+        try:
+            name, version = extract_network_info(os.path.basename(path))
+        except HTTPException:
+            logger.warning("Skipping %s: not a road network file name", path)
+            continue
+        versions = plan.setdefault(name, {})
+        if version in versions:
+            logger.warning(
+                "Skipping %s: version %s of %s is already in %s",
+                path,
+                version,
+                name,
+                versions[version],
+            )
+            continue
+        versions[version] = path
+    return {
+        name: sorted(versions.items(), key=lambda item: version_key(item[0]))
+        for name, versions in plan.items()
+    }
+
+
+def parse_network_file(path: str) -> tuple[str, list[dict]]:
+    # Runs in a worker process; edges are assigned to their network on write
+    try:
+        with open(path, "rb") as file:
+            content_digest = file_digest(file)
+            geojson_data = load_geojson_file(file)
+        return content_digest, geojson_to_road_edges(geojson_data, None)
+    except HTTPException as e:
+        # HTTPException cannot be unpickled in the parent, which would break
+        # the pool for every other file
+        raise ValueError(e.detail) from None
+
+
+class Progress:
+    """Thread-safe counters logged as each file finishes."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.edges = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def done(self, name: str, version: str, outcome: str, edges: int = 0):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.edges += edges
+            finished = self.imported + self.skipped + self.failed
+            elapsed = time.perf_counter() - self.started
+            logger.info(
+                "[%d/%d] %s %s %s, %d edges; %.0f edges/s overall",
+                finished,
+                self.total,
+                name,
+                version,
+                outcome,
+                edges,
+                self.edges / elapsed if elapsed else 0,
+            )
+
+
+def _import_network(
+    db, pool, customer_id: int, name: str, versions: list, progress: Progress
+):
+    # Versions of one network are applied in order by one writer, since each
+    # update is matched against the edges of the version before it
+    pending = list(versions)
+    try:
+        network = get_road_network_by_name(db, customer_id, name)
+        while network is not None and pending:
+            # Resume after the version the network already has
+            version, _ = pending[0]
+            if version_key(version) > version_key(network.version):
+                break
+            progress.done(name, version, "skipped")
+            pending.pop(0)
+
+        # Parse the next version while the current one is written
+        parsed = pool.submit(parse_network_file, pending[0][1]) if pending else None
+        while pending:
+            version, path = pending[0]
+            content_digest, edges = parsed.result()
+            if len(pending) > 1:
+                parsed = pool.submit(parse_network_file, pending[1][1])
+            if network is None:
+                response = create_road_network_from_edges(
+                    db, customer_id, name, version, edges, content_digest
+                )
+                network = db.get(models.RoadNetwork, response.id)
+            elif content_digest == network.content_digest:
+                update_road_network_version(db, network, version)
+                edges = []
+            else:
+                update_road_network(db, network, edges, version, content_digest)
+            pending.pop(0)
+            progress.done(name, version, "imported", len(edges))
+    except Exception as e:
+        db.rollback()
+        detail = e.detail if isinstance(e, HTTPException) else e
+        logger.error(
+            "Failed to import %s: %s", pending[0][1] if pending else name, detail
+        )
+        # Later versions depend on this one, so the rest of the network is
+        # left for a rerun
+        for version, _ in pending:
+            progress.done(name, version, "failed")
+
+
+def import_networks(
+    paths: list[str],
+    customer_id: int,
+    connections: int = 4,
+    processes: int = None,
+    database_url: str = DATABASE_URL,
+) -> Progress:
+    plan = plan_imports(paths)
+    progress = Progress(sum(len(versions) for versions in plan.values()))
+    logger.info(
+        "Importing %d files of %d networks with %d connections",
+        progress.total,
+        len(plan),
+        connections,
+    )
+
+    engine = create_engine(database_url, pool_size=connections, max_overflow=0)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    names = queue.Queue()
+    for name, versions in plan.items():
+        names.put((name, versions))
+
+    def writer():
+        db = Session()
+        try:
+            while True:
+                try:
+                    name, versions = names.get_nowait()
+                except queue.Empty:
+                    return
+                _import_network(db, pool, customer_id, name, versions, progress)
+        finally:
+            db.close()
+
+    # Workers are started on demand from the writer threads; spawning them
+    # avoids forking a process that is running threads
+    with ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        threads = [threading.Thread(target=writer) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    engine.dispose()
+
+    logger.info(
+        "Import done: %d imported, %d skipped, %d failed, %d edges in %.0f s",
+        progress.imported,
+        progress.skipped,
+        progress.failed,
+        progress.edges,
+        time.perf_counter() - progress.started,
+    )
+    return progress
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Import road_network_<name>_<version>.geojson files directly "
+        "into the database. Networks are resumed after their current version, "
+        "so an interrupted import can simply be run again."
+    )
+    parser.add_argument("paths", nargs="+", help="Network files or directories")
+    parser.add_argument(
+        "--customer-id", type=int, required=True, help="Owner of the networks"
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=4,
+        help="Parallel database connections, one network written per connection",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Parser processes (default: number of CPUs)",
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    progress = import_networks(
+        args.paths, args.customer_id, args.connections, args.processes
+    )
+    if progress.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,143 @@
 import logging
+import os
 import secrets
+import uuid
 from datetime import datetime
 
 from fastapi import HTTPException, status
-from geoalchemy2.functions import ST_Equals
-from sqlalchemy import and_, or_, select
+from geoalchemy2 import Geography
+from geoalchemy2.functions import (
+    ST_AsBinary,
+    ST_Equals,
+    ST_Extent,
+    ST_Length,
+    ST_XMax,
+    ST_XMin,
+    ST_YMax,
+    ST_YMin,
+)
+from sqlalchemy import and_, cast, delete, exists, func, insert, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from . import models, schemas
-from .utils import geojson_to_road_edges, road_edges_to_geojson
+from .metrics import count_edges, timed
+from .snapping import EdgeIndex, get_cached_edge_index
+from .uploads import remove_upload, write_chunk
+from .utils import geojson_to_road_edges, road_edges_to_geojson, sort_edges_spatially
 
 logger = logging.getLogger(__name__)
 
+# Properties whose value distribution is counted in the network stats
+STATS_PROPERTY_KEYS = [
+    key.strip()
+    for key in os.getenv("STATS_PROPERTY_KEYS", "highway").split(",")
+    if key.strip()
+]
+
+
+def _property_filter(model, property_filters: dict[str, list]):
+    # Property sets are interned, so the containment predicates run against
+    # the GIN index of the small property_sets table, not against every edge
+    matching = select(models.PropertySet.id).where(
+        *[
+            or_(
+                *[
+                    models.PropertySet.properties.contains({key: value})
+                    for value in values
+                ]
+            )
+            for key, values in property_filters.items()
+        ]
+    )
+    return model.property_set_id.in_(matching)
+
+
+def _network_edges(db: Session, network_id: int, *entities):
+    # Always filter on the partition key so the planner prunes to one partition
+    query = db.query(*entities) if entities else db.query(models.RoadEdge)
+    return query.filter(models.RoadEdge.network_id == network_id)
+
+
+def compute_network_stats(
+    db: Session, network: models.RoadNetwork
+) -> models.RoadNetworkStats:
+    # Aggregated in the database so the edges are never loaded into Python;
+    # the caller commits together with the edges the figures describe
+    current = (
+        _network_edges(db, network.id)
+        .filter(models.RoadEdge.is_current == True)
+        .subquery()
+    )
+    totals = db.execute(
+        select(
+            func.count(),
+            func.coalesce(
+                func.sum(ST_Length(cast(current.c.geometry, Geography(srid=4326)))), 0
+            ),
+            ST_XMin(ST_Extent(current.c.geometry)),
+            ST_YMin(ST_Extent(current.c.geometry)),
+            ST_XMax(ST_Extent(current.c.geometry)),
+            ST_YMax(ST_Extent(current.c.geometry)),
+        )
+    ).one()
+
+    property_counts = {}
+    for key in STATS_PROPERTY_KEYS:
+        value = models.PropertySet.properties[key].astext
+        rows = db.execute(
+            select(value, func.count())
+            .join_from(
+                current,
+                models.PropertySet,
+                models.PropertySet.id == current.c.property_set_id,
+            )
+            .where(value.is_not(None))
+            .group_by(value)
+        ).all()
+        property_counts[key] = {row[0]: row[1] for row in rows}
+
+    stats = models.RoadNetworkStats(
+        network_id=network.id,
+        version=network.version,
+        edge_count=totals[0],
+        total_length_m=totals[1],
+        min_x=totals[2],
+        min_y=totals[3],
+        max_x=totals[4],
+        max_y=totals[5],
+        property_counts=property_counts,
+        computed_at=datetime.now(),
+    )
+    # A re-uploaded version replaces the figures of the earlier upload
+    return db.merge(stats)
+
+
+def get_network_stats(
+    db: Session, network: models.RoadNetwork
+) -> schemas.RoadNetworkStatsResponse:
+    stats = db.get(models.RoadNetworkStats, (network.id, network.version))
+    if not stats:
+        logger.warning(
+            "No stats for road network %s version '%s'", network.id, network.version
+        )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No stats found for the current version of the road network",
+        )
+    bbox = None
+    if stats.edge_count:
+        bbox = [stats.min_x, stats.min_y, stats.max_x, stats.max_y]
+    return schemas.RoadNetworkStatsResponse(
+        network_id=stats.network_id,
+        version=stats.version,
+        edge_count=stats.edge_count,
+        total_length_m=stats.total_length_m,
+        bbox=bbox,
+        property_counts=stats.property_counts,
+        computed_at=stats.computed_at,
+    )
+
 
 def get_customer_by_api_key(db: Session, api_key: str) -> models.Customer:
     if api_key is None:
@@ -30,26 +156,80 @@ def get_customer_by_api_key(db: Session, api_key: str) -> models.Customer:
     return customer
 
 
+def intern_property_sets(db: Session, edges: list[dict], batch_size: int = 1000):
+    # Bulk writes insert the property sets of their edge dicts up front; edges
+    # created as ORM objects are interned by models.intern_new_property_sets
+    property_sets = {edge["property_set_id"]: edge["properties"] for edge in edges}
+    rows = [{"id": key, "properties": value} for key, value in property_sets.items()]
+    for start in range(0, len(rows), batch_size):
+        db.execute(
+            pg_insert(models.PropertySet)
+            .values(rows[start : start + batch_size])
+            .on_conflict_do_nothing()
+        )
+
+
 def create_road_network(
-    db: Session, road_network: schemas.RoadNetworkObject, customer_id: int
+    db: Session,
+    road_network: schemas.RoadNetworkObject,
+    customer_id: int,
+    content_digest: str = None,
+) -> schemas.RoadNetworkResponse:
+    with timed("geojson_to_road_edges"):
+        edges = geojson_to_road_edges(road_network.geojson, None)
+    return create_road_network_from_edges(
+        db,
+        customer_id,
+        road_network.name,
+        road_network.version,
+        edges,
+        content_digest,
+    )
+
+
+def create_road_network_from_edges(
+    db: Session,
+    customer_id: int,
+    name: str,
+    version: str,
+    edges: list[dict],
+    content_digest: str = None,
 ) -> schemas.RoadNetworkResponse:
 
     db_network = models.RoadNetwork(
         customer_id=customer_id,
-        name=road_network.name,
-        version=road_network.version,
+        name=name,
+        version=version,
         upload_time=datetime.now(),
+        content_digest=content_digest,
     )
+    # Flushed, not committed, so the network and its edges are committed
+    # together and an interrupted load leaves no empty network behind
     db.add(db_network)
-    db.commit()
-    db.refresh(db_network)
+    db.flush()
 
     # Add edges
-    edges = geojson_to_road_edges(road_network.geojson, db_network.id)
-
-    road_edges = [models.RoadEdge(**edge) for edge in edges]
-    db.bulk_save_objects(road_edges)
-    db.commit()
+    with timed("spatial_sort"):
+        edges = sort_edges_spatially(edges)
+    with timed("intern_property_sets"):
+        intern_property_sets(db, edges)
+
+    road_edges = [
+        models.RoadEdge(
+            network_id=db_network.id,
+            property_set_id=edge["property_set_id"],
+            geometry=edge["geometry"],
+            valid_from=edge["valid_from"],
+        )
+        for edge in edges
+    ]
+    with timed("bulk_save_objects"):
+        db.bulk_save_objects(road_edges)
+    with timed("compute_stats"):
+        compute_network_stats(db, db_network)
+    with timed("commit"):
+        db.commit()
+    count_edges("new", len(road_edges))
 
     return schemas.RoadNetworkResponse(
         id=db_network.id,
@@ -94,22 +274,36 @@ def get_edges_for_network(
     db: Session,
     network_id: int,
     query_time: datetime = None,
+    property_filters: dict[str, list] = None,
 ) -> dict:
 
-    edges = db.query(models.RoadEdge).filter(models.RoadEdge.network_id == network_id)
-    if query_time:
-        # Get edges valid at the specified time
-        edges = edges.filter(
-            and_(
-                models.RoadEdge.valid_from <= query_time,
-                or_(
-                    models.RoadEdge.valid_to >= query_time,
-                    models.RoadEdge.valid_to.is_(None),
-                ),
+    with timed("fetch_edges"):
+        edges = _network_edges(db, network_id)
+        history = db.query(models.RoadEdgeHistory)
+        if property_filters:
+            edges = edges.filter(_property_filter(models.RoadEdge, property_filters))
+            history = history.filter(
+                _property_filter(models.RoadEdgeHistory, property_filters)
             )
-        ).all()
-    else:
-        edges = edges.filter(models.RoadEdge.is_current == True).all()
+        if query_time:
+            # Get edges valid at the specified time
+            edges = edges.filter(
+                and_(
+                    models.RoadEdge.valid_from <= query_time,
+                    or_(
+                        models.RoadEdge.valid_to >= query_time,
+                        models.RoadEdge.valid_to.is_(None),
+                    ),
+                )
+            ).all()
+            # Archived edges only matter for time travel reads
+            edges += history.filter(
+                models.RoadEdgeHistory.network_id == network_id,
+                models.RoadEdgeHistory.valid_from <= query_time,
+                models.RoadEdgeHistory.valid_to >= query_time,
+            ).all()
+        else:
+            edges = edges.filter(models.RoadEdge.is_current == True).all()
     if not edges:
         logger.warning(
             "No edges found for road network %s at time %s", network_id, query_time
@@ -119,58 +313,124 @@ def get_edges_for_network(
             detail="No edges found for the specified road network",
         )
 
-    return road_edges_to_geojson(edges)
+    with timed("serialize"):
+        return road_edges_to_geojson(edges)
+
+
+def get_edge_changes(db: Session, network_id: int, since: datetime) -> dict:
+    changes = []
+    with timed("fetch_edges"):
+        # One query per table and change type, each served by the
+        # (network_id, valid_from), (network_id, valid_to) or
+        # (network_id, reactivated_at) index
+        for model in (models.RoadEdge, models.RoadEdgeHistory):
+            for change, column, *criteria in (
+                ("added", model.valid_from),
+                ("removed", model.valid_to),
+                # An edge added after since is already reported as added
+                ("added", model.reactivated_at, model.valid_from <= since),
+            ):
+                edges = (
+                    db.query(model)
+                    .filter(model.network_id == network_id, column > since, *criteria)
+                    .all()
+                )
+                changes += [(getattr(edge, column.key), change, edge) for edge in edges]
+    changes.sort(key=lambda item: item[0])
+
+    with timed("serialize"):
+        features = road_edges_to_geojson([edge for _, _, edge in changes])["features"]
+        return {
+            "since": since,
+            "next_since": changes[-1][0] if changes else since,
+            "changes": [
+                {
+                    "change": change,
+                    "edge_id": edge.id,
+                    "changed_at": changed_at,
+                    "feature": feature,
+                }
+                for (changed_at, change, edge), feature in zip(changes, features)
+            ],
+        }
 
 
 def update_road_network(
-    db: Session, network: models.RoadNetwork, new_edges: list[dict], version: str
+    db: Session,
+    network: models.RoadNetwork,
+    new_edges: list[dict],
+    version: str,
+    content_digest: str = None,
 ) -> schemas.RoadNetworkResponse:
 
     try:
+        with timed("intern_property_sets"):
+            intern_property_sets(db, new_edges)
+        with timed("spatial_sort"):
+            new_edges = sort_edges_spatially(new_edges)
+
         # Mark current edges as old
-        db.query(models.RoadEdge).filter(
-            models.RoadEdge.network_id == network.id, models.RoadEdge.is_current == True
-        ).update({"is_current": False, "valid_to": datetime.now()})
+        superseded_at = datetime.now()
+        _network_edges(db, network.id).filter(
+            models.RoadEdge.is_current == True
+        ).update({"is_current": False, "valid_to": superseded_at})
 
         network.version = version
         network.upload_time = datetime.now()
+        network.content_digest = content_digest
         db.add(network)
 
         reactivated_count = 0
         new_count = 0
 
-        for new_edge in new_edges:
-            # Perform matching directly in the database
-            matching_edge = (
-                db.query(models.RoadEdge)
-                .filter(
-                    models.RoadEdge.network_id == network.id,
-                    models.RoadEdge.is_current == False,
-                    models.RoadEdge.properties == new_edge["properties"],
-                    ST_Equals(models.RoadEdge.geometry, new_edge["geometry"]),
+        with timed("match_edges"):
+            for new_edge in new_edges:
+                # Perform matching directly in the database
+                # Edges closed above are only carried over, while edges
+                # superseded by an earlier version come back
+                match = (
+                    _network_edges(
+                        db,
+                        network.id,
+                        models.RoadEdge,
+                        models.RoadEdge.valid_to < superseded_at,
+                    )
+                    .filter(
+                        models.RoadEdge.is_current == False,
+                        models.RoadEdge.property_set_id == new_edge["property_set_id"],
+                        ST_Equals(models.RoadEdge.geometry, new_edge["geometry"]),
+                    )
+                    .first()
                 )
-                .first()
-            )
 
-            if matching_edge:
-                # Reactivate existing edge
-                matching_edge.is_current = True
-                matching_edge.valid_to = None
-                db.add(matching_edge)
-                reactivated_count += 1
-            else:
-                # Create new edge
-                db_edge = models.RoadEdge(
-                    network_id=network.id,
-                    properties=new_edge["properties"],
-                    geometry=new_edge["geometry"],
-                    valid_from=datetime.now(),
-                    is_current=True,
-                )
-                db.add(db_edge)
-                new_count += 1
-
-        db.commit()
+                if match:
+                    # Reactivate existing edge
+                    matching_edge, superseded_earlier = match
+                    matching_edge.is_current = True
+                    matching_edge.valid_to = None
+                    if superseded_earlier:
+                        matching_edge.reactivated_at = superseded_at
+                    db.add(matching_edge)
+                    reactivated_count += 1
+                else:
+                    # Create new edge
+                    db_edge = models.RoadEdge(
+                        network_id=network.id,
+                        property_set_id=new_edge["property_set_id"],
+                        geometry=new_edge["geometry"],
+                        valid_from=datetime.now(),
+                        is_current=True,
+                    )
+                    db.add(db_edge)
+                    new_count += 1
+
+        with timed("compute_stats"):
+            db.flush()
+            compute_network_stats(db, network)
+        with timed("commit"):
+            db.commit()
+        count_edges("reactivated", reactivated_count)
+        count_edges("new", new_count)
 
         logger.info(
             f"Updated road network {network.id} to version '{version}': "
@@ -188,6 +448,93 @@ def update_road_network(
         )
 
 
+def update_road_network_version(
+    db: Session, network: models.RoadNetwork, version: str
+) -> models.RoadNetwork:
+    # The file is unchanged, so the current edges and their stats already
+    # describe the new version; only the network row and stats are written
+    stats = db.get(models.RoadNetworkStats, (network.id, network.version))
+    if stats:
+        columns = models.RoadNetworkStats.__table__.columns.keys()
+        copied = {column: getattr(stats, column) for column in columns}
+        db.merge(models.RoadNetworkStats(**{**copied, "version": version}))
+
+    network.version = version
+    network.upload_time = datetime.now()
+    db.add(network)
+    db.commit()
+
+    logger.info(
+        "Updated road network %s to version '%s' without edge changes",
+        network.id,
+        version,
+    )
+    return network
+
+
+def archive_superseded_edges(
+    db: Session, older_than: datetime, network_id: int = None
+) -> int:
+    columns = [
+        models.RoadEdge.id,
+        models.RoadEdge.network_id,
+        models.RoadEdge.property_set_id,
+        models.RoadEdge.geometry,
+        models.RoadEdge.is_current,
+        models.RoadEdge.valid_from,
+        models.RoadEdge.valid_to,
+        models.RoadEdge.reactivated_at,
+    ]
+    superseded = delete(models.RoadEdge).where(
+        models.RoadEdge.is_current == False,
+        models.RoadEdge.valid_to < older_than,
+    )
+    if network_id is not None:
+        superseded = superseded.where(models.RoadEdge.network_id == network_id)
+
+    # Move the rows in one statement: DELETE ... RETURNING feeds the INSERT
+    moved = superseded.returning(*columns).cte("moved")
+    result = db.execute(
+        insert(models.RoadEdgeHistory).from_select(
+            [column.key for column in columns], select(moved)
+        )
+    )
+    db.commit()
+    logger.info(
+        "Archived %d superseded edges older than %s", result.rowcount, older_than
+    )
+    return result.rowcount
+
+
+def purge_edge_history(db: Session, older_than: datetime) -> int:
+    result = db.execute(
+        delete(models.RoadEdgeHistory).where(
+            models.RoadEdgeHistory.valid_to < older_than
+        )
+    )
+    db.commit()
+    logger.info("Purged %d history edges older than %s", result.rowcount, older_than)
+    return result.rowcount
+
+
+def purge_unused_property_sets(db: Session) -> int:
+    # Writers insert property sets before the edges that reference them, so
+    # the table lock waits for writers in flight and holds off new ones until
+    # the delete commits; otherwise a set could be deleted under a new edge
+    db.execute(text("LOCK TABLE property_sets IN SHARE ROW EXCLUSIVE MODE"))
+    result = db.execute(
+        delete(models.PropertySet).where(
+            ~exists().where(models.RoadEdge.property_set_id == models.PropertySet.id),
+            ~exists().where(
+                models.RoadEdgeHistory.property_set_id == models.PropertySet.id
+            ),
+        )
+    )
+    db.commit()
+    logger.info("Purged %d unused property sets", result.rowcount)
+    return result.rowcount
+
+
 def get_road_network_by_id(
     db: Session, network_id: int, customer_id: int
 ) -> models.RoadNetwork:
@@ -208,3 +555,137 @@ def get_road_network_by_id(
             detail="Road network not found",
         )
     return road_network
+
+
+def _load_edge_index(db: Session, network_id: int) -> EdgeIndex:
+    rows = (
+        _network_edges(
+            db, network_id, models.RoadEdge.id, ST_AsBinary(models.RoadEdge.geometry)
+        )
+        .filter(models.RoadEdge.is_current == True)
+        .all()
+    )
+    if not rows:
+        logger.warning("No current edges found for road network %s", network_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No edges found for the specified road network",
+        )
+    edge_ids = [row[0] for row in rows]
+    geometries = [bytes(row[1]) for row in rows]
+    return EdgeIndex(edge_ids, geometries)
+
+
+def snap_points_to_network(
+    db: Session,
+    network: models.RoadNetwork,
+    points: list[tuple[float, float]],
+    max_distance: float = None,
+) -> schemas.SnapResponse:
+    # One index per network version; a new version gets a new cache key
+    edge_index = get_cached_edge_index(
+        (network.id, network.version), lambda: _load_edge_index(db, network.id)
+    )
+    return schemas.SnapResponse(results=edge_index.snap(points, max_distance))
+
+
+def _upload_session_response(
+    upload_session: models.UploadSession,
+) -> schemas.UploadSessionResponse:
+    return schemas.UploadSessionResponse(
+        id=upload_session.id,
+        filename=upload_session.filename,
+        road_network_id=upload_session.network_id,
+        offset=upload_session.size,
+        created_at=upload_session.created_at,
+        updated_at=upload_session.updated_at,
+    )
+
+
+def create_upload_session(
+    db: Session, customer_id: int, filename: str, network_id: int = None
+) -> schemas.UploadSessionResponse:
+    now = datetime.now()
+    upload_session = models.UploadSession(
+        id=uuid.uuid4().hex,
+        customer_id=customer_id,
+        network_id=network_id,
+        filename=filename,
+        size=0,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(upload_session)
+    db.commit()
+    return _upload_session_response(upload_session)
+
+
+def get_upload_session(
+    db: Session, upload_id: str, customer_id: int, for_update: bool = False
+) -> models.UploadSession:
+    query = db.query(models.UploadSession).filter(
+        models.UploadSession.id == upload_id,
+        models.UploadSession.customer_id == customer_id,
+    )
+    if for_update:
+        # Serializes chunks of one upload sent concurrently
+        query = query.with_for_update()
+    upload_session = query.first()
+    if not upload_session:
+        logger.warning("Upload session %s not found", upload_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found"
+        )
+    return upload_session
+
+
+def get_upload_session_status(
+    db: Session, upload_id: str, customer_id: int
+) -> schemas.UploadSessionResponse:
+    return _upload_session_response(get_upload_session(db, upload_id, customer_id))
+
+
+def append_upload_chunk(
+    db: Session, upload_id: str, customer_id: int, offset: int, chunk: bytes
+) -> schemas.UploadSessionResponse:
+    upload_session = get_upload_session(db, upload_id, customer_id, for_update=True)
+    size = upload_session.size
+    if offset != size:
+        db.rollback()
+        logger.warning(
+            "Chunk offset %d of upload %s does not match its size %d",
+            offset,
+            upload_id,
+            size,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Chunk offset must be the current upload size {size}",
+        )
+    with timed("write_chunk"):
+        upload_session.size = write_chunk(upload_id, offset, chunk)
+    upload_session.updated_at = datetime.now()
+    db.commit()
+    return _upload_session_response(upload_session)
+
+
+def expire_upload_sessions(db: Session, older_than: datetime) -> int:
+    # Sessions a chunk is being appended to right now are locked and skipped
+    stale = (
+        db.query(models.UploadSession)
+        .filter(models.UploadSession.updated_at < older_than)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for upload_session in stale:
+        remove_upload(upload_session.id)
+        db.delete(upload_session)
+    db.commit()
+    logger.info("Expired %d upload sessions idle since %s", len(stale), older_than)
+    return len(stale)
+
+
+def delete_upload_session(db: Session, upload_session: models.UploadSession):
+    remove_upload(upload_session.id)
+    db.delete(upload_session)
+    db.commit()
@@ -8,9 +8,15 @@ DATABASE_URL = os.getenv(
     "DATABASE_URL", "postgresql://postgres:postgres@db:5432/road_network"
 )
 
+# Optional read replica for read-only endpoints; without it they use the primary
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = create_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
 
@@ -22,3 +28,13 @@ def get_db():
     finally:
         db.close()
         logging.debug("DB session closed")
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    logging.debug("Read DB session started")
+    try:
+        yield db
+    finally:
+        db.close()
+        logging.debug("Read DB session closed")
@@ -1,38 +1,81 @@
 import logging
 from datetime import datetime
 
-from fastapi import Depends, FastAPI, File, Header, HTTPException, UploadFile, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, ORJSONResponse
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from . import metrics, profiling, slow_queries
 from .crud import (
+    append_upload_chunk,
     create_customer,
     create_road_network,
+    create_upload_session,
+    delete_upload_session,
     get_customer_by_api_key,
+    get_edge_changes,
     get_edges_for_network,
+    get_network_stats,
     get_road_network_by_id,
     get_road_network_by_name,
+    get_upload_session,
+    get_upload_session_status,
+    snap_points_to_network,
     update_road_network,
+    update_road_network_version,
 )
-from .database import engine, get_db
-from .models import Base
+from .database import get_db, get_read_db
+from .metrics import MetricsMiddleware, render_metrics, timed
+from .profiling import ProfilingMiddleware, list_profiles, profile_path, profiled
 from .schemas import (
     CustomerCreate,
     CustomerResponse,
+    EdgeChangesResponse,
     GeoJSONFeatureCollection,
     RoadNetworkObject,
     RoadNetworkResponse,
+    RoadNetworkStatsResponse,
+    SnapRequest,
+    SnapResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
+)
+from .slow_queries import slow_query_report
+from .uploads import read_chunk, upload_path
+from .utils import (
+    extract_network_info,
+    file_digest,
+    geojson_to_road_edges,
+    load_geojson_file,
+    parse_property_filters,
+    verify_admin_token,
 )
-from .utils import extract_network_info, geojson_to_road_edges, load_geojson_file
 
 logger = logging.getLogger(__name__)
 app = FastAPI()
-
-# Initialize database
-Base.metadata.create_all(bind=engine)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# Listen on the Engine class so every engine, including ones created by tests
+# or for read replicas, is instrumented
+metrics.instrument_engine(Engine)
+profiling.instrument_engine(Engine)
+slow_queries.instrument_engine(Engine)
 
 
 @app.post("/api/customers/", response_model=CustomerResponse)
+@profiled
 def add_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
     try:
         return create_customer(db, customer)
@@ -48,49 +91,35 @@ def add_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
         )
 
 
-@app.post(
-    "/api/road-networks/",
-    response_model=RoadNetworkResponse,
-    summary="Upload a new road network",
-)
-def upload_network(
-    x_api_key: str = Header(...),
-    db: Session = Depends(get_db),
-    file: UploadFile = File(...),
-):
-    customer = get_customer_by_api_key(db, x_api_key)
-    name, version = extract_network_info(file.filename)
+def _ingest_new_network(
+    db: Session, customer_id: int, filename: str, file
+) -> RoadNetworkResponse:
+    name, version = extract_network_info(filename)
 
-    existing_network = get_road_network_by_name(db, customer.id, name)
+    existing_network = get_road_network_by_name(db, customer_id, name)
     if existing_network:
         logger.warning(
-            "Road network %s already exists for customer %s", name, customer.id
+            "Road network %s already exists for customer %s", name, customer_id
         )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Road network already exists. Use PUT to update.",
         )
-    geojson_data = load_geojson_file(file.file)
+    with timed("file_digest"):
+        content_digest = file_digest(file)
+    with timed("load_geojson_file"):
+        geojson_data = load_geojson_file(file)
     road_network = RoadNetworkObject(name=name, geojson=geojson_data, version=version)
-    return create_road_network(db, road_network, customer.id)
+    return create_road_network(db, road_network, customer_id, content_digest)
 
 
-@app.put(
-    "/api/road-networks/{road_network_id}",
-    response_model=RoadNetworkResponse,
-    summary="Update an existing road network",
-)
-def update_network(
-    road_network_id: int,
-    x_api_key: str = Header(...),
-    db: Session = Depends(get_db),
-    file: UploadFile = File(...),
-):
-    customer = get_customer_by_api_key(db, x_api_key)
-    name, version = extract_network_info(file.filename)
-    existing_network = get_road_network_by_id(db, road_network_id, customer.id)
+def _ingest_network_update(
+    db: Session, customer_id: int, road_network_id: int, filename: str, file
+) -> RoadNetworkResponse:
+    name, version = extract_network_info(filename)
+    existing_network = get_road_network_by_id(db, road_network_id, customer_id)
     if not existing_network:
-        logger.warning("Road network %s not found for customer %s", name, customer.id)
+        logger.warning("Road network %s not found for customer %s", name, customer_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Road network not found"
         )
@@ -109,15 +138,171 @@ def update_network(
             "Road network %s with version %s already exists for customer %s",
             existing_network.name,
             version,
-            customer.id,
+            customer_id,
         )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Road network with this version already exists. Use a different version.",
         )
-    geojson_data = load_geojson_file(file.file)
-    edges = geojson_to_road_edges(geojson_data, existing_network.id)
-    return update_road_network(db, existing_network, edges, version)
+    with timed("file_digest"):
+        content_digest = file_digest(file)
+    if content_digest == existing_network.content_digest:
+        # Re-sent file under a new version: skip parsing and edge matching
+        return update_road_network_version(db, existing_network, version)
+    with timed("load_geojson_file"):
+        geojson_data = load_geojson_file(file)
+    with timed("geojson_to_road_edges"):
+        edges = geojson_to_road_edges(geojson_data, existing_network.id)
+    return update_road_network(db, existing_network, edges, version, content_digest)
+
+
+@app.post(
+    "/api/road-networks/",
+    response_model=RoadNetworkResponse,
+    summary="Upload a new road network",
+)
+@profiled
+def upload_network(
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+    file: UploadFile = File(...),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    return _ingest_new_network(db, customer.id, file.filename, file.file)
+
+
+@app.put(
+    "/api/road-networks/{road_network_id}",
+    response_model=RoadNetworkResponse,
+    summary="Update an existing road network",
+)
+@profiled
+def update_network(
+    road_network_id: int,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+    file: UploadFile = File(...),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    return _ingest_network_update(
+        db, customer.id, road_network_id, file.filename, file.file
+    )
+
+
+@app.post(
+    "/api/uploads/",
+    response_model=UploadSessionResponse,
+    summary="Start a resumable upload of a road network file",
+)
+@profiled
+def start_upload(
+    upload: UploadSessionCreate,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    # Reject a bad filename or network before any bytes are sent
+    extract_network_info(upload.filename)
+    if upload.road_network_id is not None:
+        get_road_network_by_id(db, upload.road_network_id, customer.id)
+    return create_upload_session(
+        db, customer.id, upload.filename, upload.road_network_id
+    )
+
+
+@app.get(
+    "/api/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    summary="Get the offset to resume a resumable upload at",
+)
+@profiled
+def get_upload(
+    upload_id: str,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    return get_upload_session_status(db, upload_id, customer.id)
+
+
+@app.put(
+    "/api/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    summary="Append a chunk to a resumable upload",
+    # The body is read by read_chunk, so it is documented here
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"}
+                }
+            },
+        }
+    },
+)
+@profiled
+def upload_chunk(
+    upload_id: str,
+    offset: int,
+    chunk: bytes = Depends(read_chunk),
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    return append_upload_chunk(db, upload_id, customer.id, offset, chunk)
+
+
+@app.post(
+    "/api/uploads/{upload_id}/commit",
+    response_model=RoadNetworkResponse,
+    summary="Create or update the road network from a resumable upload",
+)
+@profiled
+def commit_upload(
+    upload_id: str,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    upload_session = get_upload_session(db, upload_id, customer.id)
+    if not upload_session.size:
+        logger.warning("Upload %s committed without any chunks", upload_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Upload is empty"
+        )
+    # A failed commit keeps the upload, so it can be retried or deleted
+    with open(upload_path(upload_session.id), "rb") as file:
+        if upload_session.network_id is None:
+            road_network = _ingest_new_network(
+                db, customer.id, upload_session.filename, file
+            )
+        else:
+            road_network = _ingest_network_update(
+                db,
+                customer.id,
+                upload_session.network_id,
+                upload_session.filename,
+                file,
+            )
+    response = RoadNetworkResponse.model_validate(road_network, from_attributes=True)
+    delete_upload_session(db, upload_session)
+    return response
+
+
+@app.delete(
+    "/api/uploads/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Abort a resumable upload",
+)
+@profiled
+def abort_upload(
+    upload_id: str,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    delete_upload_session(db, get_upload_session(db, upload_id, customer.id))
 
 
 @app.get(
@@ -125,11 +310,18 @@ def update_network(
     response_model=GeoJSONFeatureCollection,
     summary="Get a road network by name",
 )
+@profiled
 def get_network(
     road_network_id: int,
     query_time: str | None = None,
+    property_filters: list[str] = Query(
+        [],
+        alias="property",
+        description="key:value[,value...]; values of one key are alternatives, "
+        "repeated keys must all match",
+    ),
     x_api_key: str = Header(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     customer = get_customer_by_api_key(db, x_api_key)
     try:
@@ -148,4 +340,114 @@ def get_network(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Road network not found"
         )
-    return get_edges_for_network(db, road_network.id, query_time)
+    geojson = get_edges_for_network(
+        db, road_network.id, query_time, parse_property_filters(property_filters)
+    )
+    # Returning a response skips validating every feature against the
+    # response_model, which is kept for the OpenAPI schema
+    with timed("encode"):
+        return ORJSONResponse(geojson)
+
+
+@app.get(
+    "/api/road-networks/{road_network_id}/changes",
+    response_model=EdgeChangesResponse,
+    summary="Get the edges added or removed since a point in time",
+)
+@profiled
+def get_changes(
+    road_network_id: int,
+    since: str,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_read_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    try:
+        since = datetime.fromisoformat(since)
+    except ValueError:
+        logger.warning("Invalid since format: %s", since)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid since format. Use standard format like 'YYYY-MM-DD HH:MM:SS'",
+        )
+    road_network = get_road_network_by_id(db, road_network_id, customer.id)
+    changes = get_edge_changes(db, road_network.id, since)
+    with timed("encode"):
+        return ORJSONResponse(changes)
+
+
+@app.post(
+    "/api/road-networks/{road_network_id}/snap",
+    response_model=SnapResponse,
+    summary="Snap a batch of points to the nearest road edges",
+)
+@profiled
+def snap_points(
+    road_network_id: int,
+    snap_request: SnapRequest,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_read_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    road_network = get_road_network_by_id(db, road_network_id, customer.id)
+    return snap_points_to_network(
+        db, road_network, snap_request.points, snap_request.max_distance
+    )
+
+
+@app.get(
+    "/api/road-networks/{road_network_id}/stats",
+    response_model=RoadNetworkStatsResponse,
+    summary="Get summary stats of the current version of a road network",
+)
+@profiled
+def get_stats(
+    road_network_id: int,
+    x_api_key: str = Header(...),
+    db: Session = Depends(get_read_db),
+):
+    customer = get_customer_by_api_key(db, x_api_key)
+    road_network = get_road_network_by_id(db, road_network_id, customer.id)
+    return get_network_stats(db, road_network)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/internal/profiles", include_in_schema=False)
+def get_profiles(x_admin_token: str | None = Header(None)):
+    verify_admin_token(x_admin_token)
+    return list_profiles()
+
+
+@app.get("/internal/profiles/{profile_id}", include_in_schema=False)
+def download_profile(profile_id: str, x_admin_token: str | None = Header(None)):
+    verify_admin_token(x_admin_token)
+    path = profile_path(profile_id, ".prof")
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return FileResponse(
+        path, media_type="application/octet-stream", filename=f"{profile_id}.prof"
+    )
+
+
+@app.get("/internal/profiles/{profile_id}/sql", include_in_schema=False)
+def get_profile_sql(profile_id: str, x_admin_token: str | None = Header(None)):
+    verify_admin_token(x_admin_token)
+    path = profile_path(profile_id, ".json")
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return FileResponse(path, media_type="application/json")
+
+
+@app.get("/internal/slow-queries", include_in_schema=False)
+def get_slow_queries(x_admin_token: str | None = Header(None)):
+    verify_admin_token(x_admin_token)
+    return slow_query_report()
@@ -0,0 +1,160 @@
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, select, text
+
+from . import models
+from .crud import (
+    archive_superseded_edges,
+    compute_network_stats,
+    expire_upload_sessions,
+    purge_edge_history,
+    purge_unused_property_sets,
+)
+from .database import SessionLocal, engine
+from .uploads import remove_stale_uploads
+
+logger = logging.getLogger(__name__)
+
+# Superseded edges stay in road_edges for this long so recent versions can
+# still be reactivated by an update, then move to road_edges_history.
+HISTORY_ARCHIVE_AFTER_HOURS = float(os.getenv("HISTORY_ARCHIVE_AFTER_HOURS", "24"))
+# History older than this is deleted; unset keeps history forever.
+HISTORY_RETENTION_DAYS = os.getenv("HISTORY_RETENTION_DAYS")
+# Resumable uploads without a chunk for this long are abandoned and removed.
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+
+def run_history_maintenance(
+    archive_after_hours: float = HISTORY_ARCHIVE_AFTER_HOURS,
+    retention_days: float | None = None,
+) -> tuple[int, int, int]:
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        archived = archive_superseded_edges(
+            db, now - timedelta(hours=archive_after_hours)
+        )
+        purged = property_sets = 0
+        if retention_days is not None:
+            purged = purge_edge_history(db, now - timedelta(days=retention_days))
+            # Purged history can leave property sets no edge refers to
+            property_sets = purge_unused_property_sets(db)
+    finally:
+        db.close()
+    return archived, purged, property_sets
+
+
+def backfill_network_stats() -> int:
+    db = SessionLocal()
+    try:
+        missing = db.scalars(
+            select(models.RoadNetwork)
+            .outerjoin(
+                models.RoadNetworkStats,
+                and_(
+                    models.RoadNetworkStats.network_id == models.RoadNetwork.id,
+                    models.RoadNetworkStats.version == models.RoadNetwork.version,
+                ),
+            )
+            .where(models.RoadNetworkStats.network_id.is_(None))
+        ).all()
+        for network in missing:
+            compute_network_stats(db, network)
+            db.commit()
+    finally:
+        db.close()
+    return len(missing)
+
+
+def expire_uploads(ttl_hours: float = UPLOAD_SESSION_TTL_HOURS) -> tuple[int, int]:
+    older_than = datetime.now() - timedelta(hours=ttl_hours)
+    db = SessionLocal()
+    try:
+        sessions = expire_upload_sessions(db, older_than)
+        live = set(db.scalars(select(models.UploadSession.id)))
+    finally:
+        db.close()
+    # Files of sessions started after the lookup are newer than older_than
+    files = remove_stale_uploads(older_than, live)
+    return sessions, files
+
+
+def recluster_edges(include_current: bool = False) -> list[str]:
+    # CLUSTER rewrites each partition in the order of its GiST index, so edges
+    # close on the map end up on the same pages. It holds an exclusive lock
+    # while it runs, which is why the hot table is only included on request.
+    tables = [models.RoadEdgeHistory.__tablename__]
+    if include_current:
+        tables.insert(0, models.RoadEdge.__tablename__)
+    # CLUSTER of a partitioned table cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in tables:
+            logger.info("Clustering %s", table)
+            conn.execute(text(f"CLUSTER {table} USING idx_{table}_geometry"))
+            conn.execute(text(f"ANALYZE {table}"))
+    return tables
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Road network maintenance tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    history = subparsers.add_parser(
+        "history", help="Archive superseded edges and apply history retention"
+    )
+    history.add_argument(
+        "--archive-after-hours", type=float, default=HISTORY_ARCHIVE_AFTER_HOURS
+    )
+    history.add_argument(
+        "--retention-days",
+        type=float,
+        default=float(HISTORY_RETENTION_DAYS) if HISTORY_RETENTION_DAYS else None,
+    )
+    subparsers.add_parser(
+        "stats", help="Compute stats for networks whose current version has none"
+    )
+    uploads = subparsers.add_parser(
+        "uploads", help="Remove abandoned resumable uploads and their files"
+    )
+    uploads.add_argument("--ttl-hours", type=float, default=UPLOAD_SESSION_TTL_HOURS)
+    recluster = subparsers.add_parser(
+        "recluster", help="Rewrite edge history in spatial order"
+    )
+    recluster.add_argument(
+        "--include-current",
+        action="store_true",
+        help="Also cluster road_edges; blocks reads and writes while it runs",
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "history":
+        archived, purged, property_sets = run_history_maintenance(
+            args.archive_after_hours, args.retention_days
+        )
+        logger.info(
+            "History maintenance done: %d archived, %d purged, "
+            "%d unused property sets purged",
+            archived,
+            purged,
+            property_sets,
+        )
+    elif args.command == "recluster":
+        tables = recluster_edges(args.include_current)
+        logger.info("Clustered %s", ", ".join(tables))
+    elif args.command == "uploads":
+        sessions, files = expire_uploads(args.ttl_hours)
+        logger.info(
+            "Upload cleanup done: %d sessions expired, %d stale files removed",
+            sessions,
+            files,
+        )
+    elif args.command == "stats":
+        logger.info("Computed stats for %d networks", backfill_network_stats())
+
+
+if __name__ == "__main__":
+    main()
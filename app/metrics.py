@@ -0,0 +1,156 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_SECONDS = Histogram(
+    "road_network_request_seconds",
+    "Total request time",
+    ["method", "route", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "road_network_stage_seconds",
+    "Time spent in each processing stage",
+    ["route", "stage"],
+)
+DB_SECONDS = Histogram(
+    "road_network_db_seconds",
+    "Time spent executing SQL statements per request",
+    ["route"],
+)
+ROWS_FETCHED = Histogram(
+    "road_network_rows_fetched",
+    "Rows returned by the database per request",
+    ["route"],
+    buckets=(0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+RESPONSE_BYTES = Histogram(
+    "road_network_response_bytes",
+    "Response body size",
+    ["route"],
+    buckets=(1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+EDGES_WRITTEN = Counter(
+    "road_network_edges_written_total",
+    "Edges written by uploads and updates",
+    ["route", "kind"],
+)
+
+
+class RequestMetrics:
+    """Measurements collected while serving one request."""
+
+    def __init__(self):
+        self.stages: list[tuple[str, float]] = []
+        self.edges: list[tuple[str, int]] = []
+        self.db_seconds = 0.0
+        self.rows_fetched = 0
+
+
+_request_metrics: ContextVar[RequestMetrics | None] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        request_metrics = _request_metrics.get()
+        if request_metrics is None:
+            # Outside a request, e.g. the maintenance or import commands
+            STAGE_SECONDS.labels(route="", stage=stage).observe(elapsed)
+        else:
+            request_metrics.stages.append((stage, elapsed))
+
+
+def count_edges(kind: str, count: int):
+    request_metrics = _request_metrics.get()
+    if request_metrics is None:
+        EDGES_WRITTEN.labels(route="", kind=kind).inc(count)
+    else:
+        request_metrics.edges.append((kind, count))
+
+
+def instrument_engine(engine: Engine | type[Engine]):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        request_metrics = _request_metrics.get()
+        if request_metrics is None:
+            return
+        request_metrics.db_seconds += time.perf_counter() - context._metrics_start
+        if cursor.description is not None and cursor.rowcount > 0:
+            request_metrics.rows_fetched += cursor.rowcount
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request, stage and database metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics = RequestMetrics()
+        token = _request_metrics.set(request_metrics)
+        status_code = 500
+        body_bytes = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_metrics.reset(token)
+            # The router stores the matched route in the scope; label by its
+            # path template to keep the label set bounded
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], route, status_code).observe(
+                time.perf_counter() - start
+            )
+            for stage, elapsed in request_metrics.stages:
+                STAGE_SECONDS.labels(route, stage).observe(elapsed)
+            for kind, count in request_metrics.edges:
+                EDGES_WRITTEN.labels(route, kind).inc(count)
+            DB_SECONDS.labels(route).observe(request_metrics.db_seconds)
+            ROWS_FETCHED.labels(route).observe(request_metrics.rows_fetched)
+            RESPONSE_BYTES.labels(route).observe(body_bytes)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Aggregate across uvicorn/gunicorn worker processes
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
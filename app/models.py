@@ -1,17 +1,34 @@
+import os
+
 from geoalchemy2 import Geometry
 from sqlalchemy import (
     TIMESTAMP,
+    BigInteger,
     Boolean,
     Column,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
+    event,
+    inspect,
+    select,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session, declared_attr, relationship
 from sqlalchemy.sql import func
 
 from app.database import Base
+from app.utils import properties_digest
+
+# road_edges and road_edges_history are hash partitioned by network_id, so every
+# read and update of a network only touches its own partition.
+ROAD_EDGES_PARTITIONS = int(os.getenv("ROAD_EDGES_PARTITIONS", "8"))
 
 
 class Customer(Base):
@@ -34,19 +51,196 @@ class RoadNetwork(Base):
     name = Column(String, nullable=False, index=True)
     version = Column(String, nullable=False)
     upload_time = Column(TIMESTAMP(timezone=True))
+    # SHA-256 of the uploaded file of the current version
+    content_digest = Column(String)
+
+
+class UploadSession(Base):
+    """A resumable upload whose chunks are collected in a file in UPLOAD_DIR."""
+
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
+    # Set when the upload updates an existing network
+    network_id = Column(Integer, ForeignKey("road_networks.id"))
+    filename = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+class RoadNetworkStats(Base):
+    """Summary figures of one network version, computed when it is written."""
+
+    __tablename__ = "road_network_stats"
+
+    network_id = Column(Integer, ForeignKey("road_networks.id"), primary_key=True)
+    version = Column(String, primary_key=True)
+    edge_count = Column(Integer, nullable=False)
+    total_length_m = Column(Float, nullable=False)
+    min_x = Column(Float)
+    min_y = Column(Float)
+    max_x = Column(Float)
+    max_y = Column(Float)
+    property_counts = Column(JSONB, nullable=False)
+    computed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+class PropertySet(Base):
+    """A unique properties document, keyed by the digest of its content."""
+
+    __tablename__ = "property_sets"
+    __table_args__ = (
+        # Supports the @> containment filters of property filtered reads
+        Index(
+            "ix_property_sets_properties",
+            "properties",
+            postgresql_using="gin",
+            postgresql_ops={"properties": "jsonb_path_ops"},
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    properties = Column(JSONB)
+
+    @classmethod
+    def from_properties(cls, properties: dict) -> "PropertySet":
+        return cls(id=properties_digest(properties), properties=properties)
+
+
+class PropertySetMixin:
+    """Edges reference a shared PropertySet instead of storing their own JSONB."""
+
+    @declared_attr
+    def property_set_id(cls):
+        return Column(
+            BigInteger, ForeignKey("property_sets.id"), nullable=False, index=True
+        )
+
+    @declared_attr
+    def property_set(cls):
+        # selectin loads every distinct property set once per query, so edges
+        # sharing properties also share one decoded dict
+        return relationship(PropertySet, lazy="selectin", cascade="merge")
+
+    @hybrid_property
+    def properties(self) -> dict:
+        return self.property_set.properties if self.property_set else None
 
+    @properties.setter
+    def properties(self, value: dict):
+        self.property_set = PropertySet.from_properties(value)
+        self.property_set_id = self.property_set.id
 
-class RoadEdge(Base):
+    @properties.expression
+    def properties(cls):
+        return (
+            select(PropertySet.properties)
+            .where(PropertySet.id == cls.property_set_id)
+            .scalar_subquery()
+        )
+
+
+class RoadEdge(PropertySetMixin, Base):
     __tablename__ = "road_edges"
+    __table_args__ = (
+        # Serve the change feed of one network from its validity columns
+        Index("ix_road_edges_network_id_valid_from", "network_id", "valid_from"),
+        Index("ix_road_edges_network_id_valid_to", "network_id", "valid_to"),
+        Index(
+            "ix_road_edges_network_id_reactivated_at", "network_id", "reactivated_at"
+        ),
+        {"postgresql_partition_by": "HASH (network_id)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     network_id = Column(
-        Integer, ForeignKey("road_networks.id"), nullable=False, index=True
+        Integer,
+        ForeignKey("road_networks.id"),
+        primary_key=True,
+        nullable=False,
+        index=True,
     )
-    properties = Column(JSONB)
     geometry = Column(Geometry("LINESTRING", srid=4326))
     is_current = Column(Boolean, default=True)
     valid_from = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False, index=True
     )
     valid_to = Column(TIMESTAMP(timezone=True), index=True)
+    # Set when a later version brings a superseded edge back
+    reactivated_at = Column(TIMESTAMP(timezone=True))
+
+
+class RoadEdgeHistory(PropertySetMixin, Base):
+    """Superseded edges moved out of road_edges by the history maintenance job."""
+
+    __tablename__ = "road_edges_history"
+    __table_args__ = (
+        Index(
+            "ix_road_edges_history_network_id_valid_from", "network_id", "valid_from"
+        ),
+        Index("ix_road_edges_history_network_id_valid_to", "network_id", "valid_to"),
+        Index(
+            "ix_road_edges_history_network_id_reactivated_at",
+            "network_id",
+            "reactivated_at",
+        ),
+        {"postgresql_partition_by": "HASH (network_id)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    network_id = Column(
+        Integer,
+        ForeignKey("road_networks.id"),
+        primary_key=True,
+        nullable=False,
+        index=True,
+    )
+    geometry = Column(Geometry("LINESTRING", srid=4326))
+    is_current = Column(Boolean, default=False)
+    valid_from = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+    valid_to = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+    reactivated_at = Column(TIMESTAMP(timezone=True))
+
+
+def create_hash_partitions(target, connection, **kw):
+    for remainder in range(ROAD_EDGES_PARTITIONS):
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {target.name}_p{remainder} "
+                f"PARTITION OF {target.name} FOR VALUES WITH "
+                f"(MODULUS {ROAD_EDGES_PARTITIONS}, REMAINDER {remainder})"
+            )
+        )
+
+
+event.listen(RoadEdge.__table__, "after_create", create_hash_partitions)
+event.listen(RoadEdgeHistory.__table__, "after_create", create_hash_partitions)
+
+
+@event.listens_for(Session, "before_flush")
+def intern_new_property_sets(session, flush_context, instances):
+    # Edges created as ORM objects with properties= carry a transient property
+    # set; it is inserted if missing and swapped for the stored copy. Bulk
+    # writes of edge dicts use crud.intern_property_sets instead.
+    edges = [
+        obj
+        for obj in session.new
+        if isinstance(obj, PropertySetMixin)
+        and obj.property_set is not None
+        and inspect(obj.property_set).transient
+    ]
+    if not edges:
+        return
+    rows = {edge.property_set.id: edge.property_set.properties for edge in edges}
+    # Unlike merge, ON CONFLICT DO NOTHING does not fail when a concurrent
+    # writer inserts the same property set first
+    session.execute(
+        pg_insert(PropertySet)
+        .values([{"id": key, "properties": value} for key, value in rows.items()])
+        .on_conflict_do_nothing()
+    )
+    for edge in edges:
+        edge.property_set = session.get(PropertySet, edge.property_set.id)
@@ -0,0 +1,203 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from .utils import is_admin_token
+
+logger = logging.getLogger(__name__)
+
+# Share of requests profiled without being asked to, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "road-network-profiles")
+)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+# cProfile can only have one active profiler per process, so profiled requests
+# are serialized; a request that cannot get the lock simply runs unprofiled.
+_profiler_lock = Lock()
+
+
+class ProfileSession:
+    """A profiled request: its Python profile and the SQL statements it ran."""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = datetime.now()
+        self.profiler = None
+        self.statements: list[dict] = []
+
+    def metadata(self, status_code: int, seconds: float) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at.isoformat(),
+            "status_code": status_code,
+            "seconds": seconds,
+            "profiled": self.profiler is not None,
+            "sql_seconds": sum(s["seconds"] for s in self.statements),
+            "sql_statements": len(self.statements),
+        }
+
+
+_profile_session: ContextVar[ProfileSession | None] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def profiled(endpoint):
+    """Run the endpoint under cProfile when its request was selected for profiling.
+
+    Sync endpoints run in a worker thread, so the profiler has to be enabled
+    there rather than in the middleware.
+    """
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile_session = _profile_session.get()
+        if profile_session is None or not _profiler_lock.acquire(blocking=False):
+            return endpoint(*args, **kwargs)
+        try:
+            profile_session.profiler = cProfile.Profile()
+            profile_session.profiler.enable()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                profile_session.profiler.disable()
+        finally:
+            _profiler_lock.release()
+
+    return wrapper
+
+
+def instrument_engine(engine: Engine | type[Engine]):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._profile_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        profile_session = _profile_session.get()
+        if profile_session is not None:
+            profile_session.statements.append(
+                {
+                    "statement": statement,
+                    "seconds": time.perf_counter() - context._profile_start,
+                    "rowcount": cursor.rowcount,
+                }
+            )
+
+
+def _save_profile(profile_session: ProfileSession, metadata: dict):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if profile_session.profiler is not None:
+        profile_session.profiler.dump_stats(
+            os.path.join(PROFILE_DIR, f"{profile_session.id}.prof")
+        )
+    with open(os.path.join(PROFILE_DIR, f"{profile_session.id}.json"), "w") as f:
+        json.dump({**metadata, "statements": profile_session.statements}, f)
+
+    saved = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in saved[:-PROFILE_KEEP]:
+        profile_id = entry.name.removesuffix(".json")
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".json"):
+            with open(entry.path) as f:
+                metadata = json.load(f)
+            metadata.pop("statements", None)
+            profiles.append(metadata)
+    return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+
+def profile_path(profile_id: str, suffix: str) -> str | None:
+    # Ids are uuid4 hex; anything else must not reach the filesystem
+    if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware selecting requests for profiling and saving their profiles.
+
+    A request is profiled when it sends `x-profile: 1` together with a valid
+    `x-admin-token`, or when it is picked by PROFILE_SAMPLE_RATE.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope) -> str | None:
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1":
+            token = headers.get(b"x-admin-token", b"").decode("latin-1")
+            if is_admin_token(token):
+                return "requested"
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._reason(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_session = ProfileSession(scope["method"], scope["path"], reason)
+        token = _profile_session.set(profile_session)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_session.id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile_session.reset(token)
+            metadata = profile_session.metadata(
+                status_code, time.perf_counter() - start
+            )
+            try:
+                await run_in_threadpool(_save_profile, profile_session, metadata)
+            except OSError:
+                logger.exception("Failed to save profile %s", profile_session.id)
@@ -1,7 +1,10 @@
+import os
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+SNAP_MAX_POINTS = int(os.getenv("SNAP_MAX_POINTS", "10000"))
 
 
 class RoadNetworkObject(BaseModel):
@@ -36,3 +39,57 @@ class GeoJSONFeature(BaseModel):
 class GeoJSONFeatureCollection(BaseModel):
     type: str = "FeatureCollection"
     features: list[GeoJSONFeature]
+
+
+class SnapRequest(BaseModel):
+    points: list[tuple[float, float]] = Field(..., max_length=SNAP_MAX_POINTS)
+    max_distance: float | None = Field(None, gt=0)
+
+
+class SnappedPoint(BaseModel):
+    edge_id: int | None
+    distance: float | None
+    location: float | None
+    coordinates: tuple[float, float] | None
+
+
+class SnapResponse(BaseModel):
+    results: list[SnappedPoint]
+
+
+class RoadNetworkStatsResponse(BaseModel):
+    network_id: int
+    version: str
+    edge_count: int
+    total_length_m: float
+    bbox: tuple[float, float, float, float] | None
+    property_counts: dict[str, dict[str, int]]
+    computed_at: datetime
+
+
+class EdgeChange(BaseModel):
+    change: Literal["added", "removed"]
+    edge_id: int
+    changed_at: datetime
+    feature: GeoJSONFeature
+
+
+class EdgeChangesResponse(BaseModel):
+    since: datetime
+    next_since: datetime
+    changes: list[EdgeChange]
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    # Commit the upload as a new version of this network instead of a new one
+    road_network_id: int | None = None
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    filename: str
+    road_network_id: int | None
+    offset: int
+    created_at: datetime
+    updated_at: datetime
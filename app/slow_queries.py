@@ -0,0 +1,154 @@
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+# EXPLAIN ANALYZE runs the statement again, so plans of a statement are
+# captured at most once per interval
+SLOW_QUERY_PLAN_INTERVAL = float(os.getenv("SLOW_QUERY_PLAN_INTERVAL", "300"))
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "200"))
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+# String and numeric constants in plan conditions, e.g. 'key'::text or 50
+_PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(statement: str) -> str:
+    # Placeholders already keep values out of the text; this also folds
+    # expanded IN lists so they aggregate under one statement
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("?, ...", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class SlowQueryStats:
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seen = None
+        self.parameters: list[str] = []
+        self.plan = None
+        self.plan_captured_at = None
+
+    def record(self, seconds: float, parameter_names: list[str]):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seen = datetime.now()
+        # Only parameter names are kept, never their values
+        self.parameters = parameter_names
+
+    def as_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.count,
+            "max_seconds": self.max_seconds,
+            "last_seen": self.last_seen.isoformat(),
+            "parameters": self.parameters,
+            "plan": self.plan,
+        }
+
+
+def scrub_plan(plan):
+    # psycopg2 interpolates parameters client side, so the plan shows their
+    # values as constants in its conditions; those are replaced like in
+    # fingerprint
+    if isinstance(plan, dict):
+        return {key: scrub_plan(value) for key, value in plan.items()}
+    if isinstance(plan, list):
+        return [scrub_plan(value) for value in plan]
+    if isinstance(plan, str):
+        return _PLAN_LITERAL.sub("?", plan)
+    return plan
+
+
+_stats: "OrderedDict[str, SlowQueryStats]" = OrderedDict()
+_stats_lock = Lock()
+
+
+def _explain(cursor, statement: str, parameters) -> list | None:
+    # Only reads are analyzed; for writes ANALYZE would apply them twice
+    is_read = statement.lstrip()[:6].upper() == "SELECT"
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_read else "FORMAT JSON"
+    explain_cursor = cursor.connection.cursor()
+    savepoint = False
+    try:
+        # A failing EXPLAIN must not abort the caller's transaction
+        explain_cursor.execute("SAVEPOINT slow_query_explain")
+        savepoint = True
+        explain_cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+        plan = explain_cursor.fetchone()[0]
+        explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return scrub_plan(plan)
+    except Exception:
+        logger.exception("Failed to capture plan for slow query")
+        if savepoint:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        return None
+    finally:
+        explain_cursor.close()
+
+
+def instrument_engine(engine: Engine | type[Engine]):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _observe(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context._slow_query_start
+        if seconds * 1000 < SLOW_QUERY_THRESHOLD_MS:
+            return
+
+        key = fingerprint(statement)
+        logger.warning("Slow query (%.0f ms): %s", seconds * 1000, key)
+        with _stats_lock:
+            stats = _stats.pop(key, None) or SlowQueryStats(key)
+            _stats[key] = stats
+            while len(_stats) > SLOW_QUERY_MAX_STATEMENTS:
+                _stats.popitem(last=False)
+            stats.record(
+                seconds, sorted(context.compiled.binds) if context.compiled else []
+            )
+            capture_plan = (
+                not executemany
+                and conn.dialect.name == "postgresql"
+                and (
+                    stats.plan_captured_at is None
+                    or time.monotonic() - stats.plan_captured_at
+                    >= SLOW_QUERY_PLAN_INTERVAL
+                )
+            )
+            if capture_plan:
+                stats.plan_captured_at = time.monotonic()
+
+        if capture_plan:
+            plan = _explain(cursor, statement, parameters)
+            if plan is not None:
+                stats.plan = plan
+
+
+def slow_query_report() -> list[dict]:
+    with _stats_lock:
+        report = [stats.as_dict() for stats in _stats.values()]
+    return sorted(report, key=lambda stats: stats["total_seconds"], reverse=True)
+
+
+def reset_slow_queries():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,87 @@
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+import shapely
+
+logger = logging.getLogger(__name__)
+
+SNAP_INDEX_CACHE_SIZE = int(os.getenv("SNAP_INDEX_CACHE_SIZE", "16"))
+
+
+class EdgeIndex:
+    """STRtree over the current edges of one road network version."""
+
+    def __init__(self, edge_ids: list[int], geometries_wkb: list[bytes]):
+        self.edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        self.geometries = shapely.from_wkb(geometries_wkb)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self) -> int:
+        return len(self.edge_ids)
+
+    def snap(
+        self, coordinates: list[tuple[float, float]], max_distance: float = None
+    ) -> list[dict]:
+        points = shapely.points(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+        results = [
+            {"edge_id": None, "distance": None, "location": None, "coordinates": None}
+            for _ in range(len(points))
+        ]
+        if not len(points):
+            return results
+
+        (point_idx, edge_idx), distances = self.tree.query_nearest(
+            points, max_distance=max_distance, return_distance=True, all_matches=False
+        )
+        lines = self.geometries[edge_idx]
+        locations = shapely.line_locate_point(lines, points[point_idx], normalized=True)
+        snapped = shapely.get_coordinates(
+            shapely.line_interpolate_point(lines, locations, normalized=True)
+        )
+
+        for i, edge, distance, location, xy in zip(
+            point_idx.tolist(),
+            self.edge_ids[edge_idx].tolist(),
+            distances.tolist(),
+            locations.tolist(),
+            snapped.tolist(),
+        ):
+            results[i] = {
+                "edge_id": edge,
+                "distance": distance,
+                "location": location,
+                "coordinates": xy,
+            }
+        return results
+
+
+_index_cache: "OrderedDict[tuple, EdgeIndex]" = OrderedDict()
+_index_cache_lock = Lock()
+
+
+def get_cached_edge_index(key: tuple, loader: Callable[[], EdgeIndex]) -> EdgeIndex:
+    with _index_cache_lock:
+        edge_index = _index_cache.get(key)
+        if edge_index is not None:
+            _index_cache.move_to_end(key)
+            return edge_index
+
+    # Build outside the lock so a slow load does not block other networks
+    edge_index = loader()
+    logger.info("Built snapping index for %s with %d edges", key, len(edge_index))
+
+    with _index_cache_lock:
+        _index_cache[key] = edge_index
+        _index_cache.move_to_end(key)
+        while len(_index_cache) > SNAP_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return edge_index
+
+
+def clear_edge_index_cache():
+    with _index_cache_lock:
+        _index_cache.clear()
@@ -0,0 +1,90 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+from fastapi import HTTPException, Request, status
+
+logger = logging.getLogger(__name__)
+
+# Chunks of resumable uploads are appended to one file per upload session. All
+# workers must see the same directory, since chunks can reach any of them.
+UPLOAD_DIR = os.getenv(
+    "UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "road-network-uploads")
+)
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(64 << 20)))
+
+
+def upload_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def _chunk_too_large(upload_id: str, size: int):
+    logger.warning("Chunk of %d bytes for upload %s too large", size, upload_id)
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Chunks may be at most {UPLOAD_MAX_CHUNK_BYTES} bytes",
+    )
+
+
+async def read_chunk(request: Request) -> bytes:
+    """Read the chunk in the request body, rejecting oversized ones early.
+
+    Used as a dependency instead of a Body parameter, which FastAPI would
+    read in full before the endpoint could check its size.
+    """
+    upload_id = request.path_params.get("upload_id")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > UPLOAD_MAX_CHUNK_BYTES:
+        _chunk_too_large(upload_id, int(content_length))
+    # Bodies without a Content-Length are cut off once they exceed the limit
+    chunk = bytearray()
+    async for part in request.stream():
+        chunk += part
+        if len(chunk) > UPLOAD_MAX_CHUNK_BYTES:
+            _chunk_too_large(upload_id, len(chunk))
+    return bytes(chunk)
+
+
+def write_chunk(upload_id: str, offset: int, chunk: bytes) -> int:
+    """Write a chunk at offset and return the new size of the upload."""
+    if len(chunk) > UPLOAD_MAX_CHUNK_BYTES:
+        _chunk_too_large(upload_id, len(chunk))
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = upload_path(upload_id)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as file:
+        file.seek(offset)
+        file.write(chunk)
+        # Drop bytes of an earlier attempt at this offset that was never recorded
+        file.truncate()
+    return offset + len(chunk)
+
+
+def remove_upload(upload_id: str):
+    try:
+        os.remove(upload_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def remove_stale_uploads(older_than: datetime, keep: set[str]) -> int:
+    """Remove upload files last written before older_than, except those in keep.
+
+    Catches files whose session row is already gone, e.g. after a crash
+    between writing a chunk and recording it.
+    """
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+    removed = 0
+    for filename in os.listdir(UPLOAD_DIR):
+        upload_id, extension = os.path.splitext(filename)
+        if extension != ".part" or upload_id in keep:
+            continue
+        try:
+            if os.path.getmtime(upload_path(upload_id)) < older_than.timestamp():
+                os.remove(upload_path(upload_id))
+                removed += 1
+        except FileNotFoundError:
+            pass
+    logger.info("Removed %d stale upload files", removed)
+    return removed
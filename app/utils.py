@@ -1,9 +1,15 @@
+import hashlib
 import json
 import logging
+import math
+import os
 import re
+import secrets
 from datetime import datetime
 from typing import TYPE_CHECKING
 
+import numpy as np
+import shapely
 from fastapi import HTTPException, status
 from geoalchemy2.shape import from_shape, to_shape
 from shapely.geometry import mapping, shape
@@ -14,18 +20,34 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def properties_digest(properties: dict) -> int:
+    # Canonical JSON so equal documents get the same id regardless of key order
+    canonical = json.dumps(
+        properties, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
 
 def geojson_to_road_edges(geojson_data: dict, network_id: int) -> list[dict]:
     features = geojson_data.get("features", [])
     edges = []
+    property_sets = {}
 
     for feature in features:
         properties = feature.get("properties", {})
+        property_set_id = properties_digest(properties)
+        # Edges with equal properties share one dict
+        properties = property_sets.setdefault(property_set_id, properties)
         geometry = from_shape(shape(feature["geometry"]), srid=4326)
 
         edge = {
             "network_id": network_id,
             "properties": properties,
+            "property_set_id": property_set_id,
             "geometry": geometry,
             "valid_from": datetime.now(),
         }
@@ -34,6 +56,42 @@ def geojson_to_road_edges(geojson_data: dict, network_id: int) -> list[dict]:
     return edges
 
 
+def hilbert_keys(x: np.ndarray, y: np.ndarray, order: int = 16) -> np.ndarray:
+    """Positions of integer grid cells in [0, 2**order) on a Hilbert curve."""
+    n = 1 << order
+    x = x.astype(np.int64)
+    y = y.astype(np.int64)
+    keys = np.zeros(len(x), dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve stays continuous
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s >>= 1
+    return keys
+
+
+def sort_edges_spatially(edges: list[dict]) -> list[dict]:
+    # Inserting in Hilbert order of the bounding box centers puts edges that
+    # are close on the map on the same heap pages
+    if len(edges) < 2:
+        return edges
+    geometries = shapely.from_wkb([bytes(edge["geometry"].data) for edge in edges])
+    bounds = shapely.bounds(geometries)
+    x = (bounds[:, 0] + bounds[:, 2]) / 2
+    y = (bounds[:, 1] + bounds[:, 3]) / 2
+    cells = (1 << 16) - 1
+    x = (x - x.min()) / max(x.max() - x.min(), 1e-12) * cells
+    y = (y - y.min()) / max(y.max() - y.min(), 1e-12) * cells
+    order = np.argsort(hilbert_keys(x, y), kind="stable")
+    return [edges[i] for i in order.tolist()]
+
+
 def extract_network_info(filename: str) -> tuple:
     match = re.match(r"^road_network_([a-zA-Z0-9_]+)_(\d+\.\d+)\.geojson$", filename)
     if not match:
@@ -50,6 +108,44 @@ def extract_network_info(filename: str) -> tuple:
     return name, version
 
 
+def file_digest(file) -> str:
+    # Streams the spooled upload in chunks, then rewinds it for parsing
+    digest = hashlib.file_digest(file, "sha256").hexdigest()
+    file.seek(0)
+    return digest
+
+
+def parse_property_filters(filters: list[str]) -> dict[str, list]:
+    """Parse `key:value[,value...]` filters into the values allowed per key.
+
+    Values that read as JSON numbers, booleans or null also match that JSON
+    value, so `maxspeed:50` matches both `50` and `"50"`.
+    """
+    parsed = {}
+    for item in filters:
+        key, separator, values = item.partition(":")
+        if not key or not separator or not values:
+            logger.warning("Invalid property filter: %s", item)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid property filter. Use key:value[,value...]",
+            )
+        candidates = parsed.setdefault(key, [])
+        for value in values.split(","):
+            candidates.append(value)
+            try:
+                decoded = json.loads(value)
+            except ValueError:
+                continue
+            if isinstance(decoded, float) and not math.isfinite(decoded):
+                # json.loads accepts NaN and Infinity, which are not JSON and
+                # cannot be compared with JSONB
+                continue
+            if decoded is None or isinstance(decoded, (bool, int, float)):
+                candidates.append(decoded)
+    return parsed
+
+
 def load_geojson_file(file) -> dict:
     try:
         geojson_data = json.load(file)
@@ -76,3 +172,22 @@ def road_edges_to_geojson(edges: list["RoadEdge"]) -> dict:
         )
 
     return {"type": "FeatureCollection", "features": features}
+
+
+def is_admin_token(token: str | None) -> bool:
+    if not ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+def verify_admin_token(token: str | None):
+    if token is None:
+        logger.warning("Admin token is missing")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Admin token is required"
+        )
+    if not is_admin_token(token):
+        logger.warning("Invalid admin token")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token"
+        )
@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+
+LABELS = ("step", "kind", "edges", "change_ratio")
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        results = json.load(f)["results"]
+    return {tuple(result.get(label) for label in LABELS): result for result in results}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Fail when a step is this many times slower than the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    regressions = 0
+    print(
+        f"{'step':<16}{'kind':<8}{'edges':>9}{'ratio':>7}{'old s':>10}{'new s':>10}  x"
+    )
+    for key in sorted(baseline.keys() & candidate.keys(), key=str):
+        old, new = baseline[key]["seconds"], candidate[key]["seconds"]
+        factor = new / old if old else float("inf")
+        regressions += factor > args.threshold
+        step, kind, edges, change_ratio = key
+        print(
+            f"{step:<16}{kind:<8}{edges:>9}{change_ratio if change_ratio is not None else '':>7}"
+            f"{old:>10.3f}{new:>10.3f}  {factor:.2f}{' !' if factor > args.threshold else ''}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
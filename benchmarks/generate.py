@@ -0,0 +1,116 @@
+import argparse
+import json
+import math
+import random
+
+# Rough share of each road class in OSM extracts of mixed urban/rural regions
+HIGHWAY_CLASSES = [
+    ("residential", 0.42, 30, 1),
+    ("service", 0.18, 20, 1),
+    ("unclassified", 0.1, 50, 1),
+    ("track", 0.06, 30, 1),
+    ("tertiary", 0.09, 50, 2),
+    ("secondary", 0.07, 70, 2),
+    ("primary", 0.05, 80, 2),
+    ("trunk", 0.02, 100, 2),
+    ("motorway", 0.01, 120, 3),
+]
+STREET_NAMES = [f"Street {i}" for i in range(500)]
+
+# Grid spacing and origin in degrees, roughly a city block in central Europe
+SPACING = 0.001
+ORIGIN = (11.5, 47.5)
+
+
+def random_properties(rng: random.Random) -> dict:
+    highway, _, maxspeed, lanes = rng.choices(
+        HIGHWAY_CLASSES, weights=[c[1] for c in HIGHWAY_CLASSES]
+    )[0]
+    properties = {"highway": highway, "maxspeed": maxspeed, "lanes": lanes}
+    if highway in ("motorway", "trunk") or rng.random() < 0.1:
+        properties["oneway"] = "yes"
+    if highway not in ("service", "track") and rng.random() < 0.8:
+        properties["name"] = rng.choice(STREET_NAMES)
+    return properties
+
+
+def feature(coordinates: list, properties: dict) -> dict:
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+    }
+
+
+def grid_network(edges: int, seed: int = 0) -> dict:
+    """Square street grid with about `edges` edges."""
+    rng = random.Random(seed)
+    # A k x k node grid has 2k(k - 1) edges
+    k = math.ceil((1 + math.sqrt(1 + 2 * edges)) / 2)
+    x0, y0 = ORIGIN
+    features = []
+    for i in range(k):
+        for j in range(k):
+            node = [x0 + i * SPACING, y0 + j * SPACING]
+            if i + 1 < k:
+                right = [x0 + (i + 1) * SPACING, y0 + j * SPACING]
+                features.append(feature([node, right], random_properties(rng)))
+            if j + 1 < k:
+                up = [x0 + i * SPACING, y0 + (j + 1) * SPACING]
+                features.append(feature([node, up], random_properties(rng)))
+    return {"type": "FeatureCollection", "features": features[:edges]}
+
+
+def random_network(edges: int, seed: int = 0) -> dict:
+    """Randomly placed polylines of 2 to 6 vertices over the same extent as the grid."""
+    rng = random.Random(seed)
+    extent = math.sqrt(edges / 2) * SPACING
+    x0, y0 = ORIGIN
+    features = []
+    for _ in range(edges):
+        x, y = x0 + rng.random() * extent, y0 + rng.random() * extent
+        coordinates = [[x, y]]
+        for _ in range(rng.randint(1, 5)):
+            x += rng.uniform(-SPACING, SPACING)
+            y += rng.uniform(-SPACING, SPACING)
+            coordinates.append([x, y])
+        features.append(feature(coordinates, random_properties(rng)))
+    return {"type": "FeatureCollection", "features": features}
+
+
+def change_network(geojson: dict, ratio: float, seed: int = 0) -> dict:
+    """Copy of the network with `ratio` of its edges moved or re-tagged."""
+    rng = random.Random(seed)
+    features = list(geojson["features"])
+    for index in rng.sample(range(len(features)), int(len(features) * ratio)):
+        old = features[index]
+        if rng.random() < 0.5:
+            coordinates = [
+                [x + SPACING / 10, y] for x, y in old["geometry"]["coordinates"]
+            ]
+            features[index] = feature(coordinates, old["properties"])
+        else:
+            maxspeed = old["properties"]["maxspeed"]
+            speeds = [speed for speed in (30, 50, 70, 100) if speed != maxspeed]
+            properties = {**old["properties"], "maxspeed": rng.choice(speeds)}
+            features[index] = feature(old["geometry"]["coordinates"], properties)
+    return {"type": "FeatureCollection", "features": features}
+
+
+GENERATORS = {"grid": grid_network, "random": random_network}
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic road network")
+    parser.add_argument("kind", choices=GENERATORS)
+    parser.add_argument("edges", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with open(args.output, "w") as f:
+        json.dump(GENERATORS[args.kind](args.edges, args.seed), f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from .generate import GENERATORS, change_network
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = "10000,100000"
+DEFAULT_CHANGE_RATIOS = "0.0,0.01,0.1,0.5"
+
+
+def reset_peak_rss(pid: int | str) -> bool:
+    # Writing 5 to clear_refs resets VmHWM, the peak resident set size, so
+    # each step reports its own peak rather than the process lifetime one
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError as e:
+        logger.warning("Cannot reset peak RSS of process %s: %s", pid, e)
+        return False
+    return True
+
+
+def peak_rss_mb(pid: int | str) -> float | None:
+    # VmHWM is in kilobytes
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_client(base_url: str | None):
+    if base_url:
+        import httpx
+
+        return httpx.Client(base_url=base_url, timeout=None)
+
+    # In process, so peak memory covers the application as well
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+class Benchmark:
+    def __init__(self, client, repeat: int, server_pid: int | str | None = "self"):
+        self.client = client
+        self.repeat = repeat
+        self.results = []
+        # The process serving the requests: this one when the app runs in
+        # process, the server's when given, else peak memory is not recorded
+        self.server_pid = server_pid
+        if server_pid is not None and not reset_peak_rss(server_pid):
+            self.server_pid = None
+
+    def measure(self, step: str, request, repeat: int = 1, **labels):
+        # Writes change state, so only reads are repeated; the best run is kept
+        timings = []
+        if self.server_pid is not None:
+            reset_peak_rss(self.server_pid)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = request()
+            timings.append(time.perf_counter() - start)
+            response.raise_for_status()
+        result = {
+            "step": step,
+            **labels,
+            "seconds": min(timings),
+            "seconds_all": timings,
+            "response_bytes": len(response.content),
+            "peak_rss_mb": (
+                peak_rss_mb(self.server_pid) if self.server_pid is not None else None
+            ),
+        }
+        logger.info("%s %s: %.3fs", step, labels, result["seconds"])
+        self.results.append(result)
+        return response
+
+    def upload(self, api_key: str, name: str, version: str, geojson: dict, **labels):
+        body = json.dumps(geojson).encode("utf-8")
+        filename = f"road_network_{name}_{version}.geojson"
+        files = {"file": (filename, body, "application/json")}
+        return self.measure(
+            "post",
+            lambda: self.client.post(
+                "/api/road-networks/", headers={"x-api-key": api_key}, files=files
+            ),
+            **labels,
+        )
+
+    def run_network(self, api_key: str, kind: str, size: int, change_ratios: list):
+        labels = {"kind": kind, "edges": size}
+        name = f"bench_{kind}_{size}_{uuid.uuid4().hex[:8]}"
+        geojson = GENERATORS[kind](size)
+
+        network_id = self.upload(api_key, name, "1.0", geojson, **labels).json()["id"]
+        headers = {"x-api-key": api_key}
+
+        self.measure(
+            "get_current",
+            lambda: self.client.get(
+                f"/api/road-networks/{network_id}", headers=headers
+            ),
+            repeat=self.repeat,
+            **labels,
+        )
+
+        query_time = datetime.now().isoformat(sep=" ")
+        for minor, ratio in enumerate(change_ratios, start=1):
+            changed = json.dumps(change_network(geojson, ratio, seed=minor)).encode()
+            files = {
+                "file": (
+                    f"road_network_{name}_1.{minor}.geojson",
+                    changed,
+                    "application/json",
+                )
+            }
+            self.measure(
+                "put",
+                lambda: self.client.put(
+                    f"/api/road-networks/{network_id}", headers=headers, files=files
+                ),
+                change_ratio=ratio,
+                **labels,
+            )
+
+        self.measure(
+            "get_query_time",
+            lambda: self.client.get(
+                f"/api/road-networks/{network_id}",
+                params={"query_time": query_time},
+                headers=headers,
+            ),
+            repeat=self.repeat,
+            **labels,
+        )
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the road network API")
+    parser.add_argument(
+        "--base-url", help="Benchmark a running server instead of the app in process"
+    )
+    parser.add_argument(
+        "--server-pid",
+        type=int,
+        help="With --base-url, record the peak memory of this server process "
+        "(Linux, same user); without it none is recorded",
+    )
+    parser.add_argument("--kinds", default=",".join(GENERATORS))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--change-ratios", default=DEFAULT_CHANGE_RATIOS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    client = make_client(args.base_url)
+    customer = client.post(
+        "/api/customers/", json={"name": f"bench-{uuid.uuid4().hex}"}
+    ).json()
+
+    benchmark = Benchmark(
+        client, args.repeat, args.server_pid if args.base_url else "self"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        for kind in args.kinds.split(","):
+            benchmark.run_network(
+                customer["api_key"],
+                kind,
+                size,
+                [float(ratio) for ratio in args.change_ratios.split(",")],
+            )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(),
+                "python": sys.version,
+                "platform": platform.platform(),
+                "base_url": args.base_url,
+                "results": benchmark.results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info("Wrote %d results to %s", len(benchmark.results), args.output)
+
+
+if __name__ == "__main__":
+    main()
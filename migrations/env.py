@@ -0,0 +1,69 @@
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from geoalchemy2 import alembic_helpers
+from sqlalchemy import text
+
+from app.database import DATABASE_URL, engine
+from app.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Arbitrary key for the advisory lock that keeps concurrent deploys from
+# running migrations at the same time
+MIGRATION_LOCK_ID = 7_301_946
+
+_PARTITION = re.compile(r"^road_edges(_history)?_p\d+$")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Hash partitions are created by the migrations, not declared as models
+    if type_ == "table" and reflected and _PARTITION.match(name):
+        return False
+    return alembic_helpers.include_object(obj, name, type_, reflected, compare_to)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+        render_item=alembic_helpers.render_item,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        connection.execute(
+            text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+        )
+        connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                include_object=include_object,
+                render_item=alembic_helpers.render_item,
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
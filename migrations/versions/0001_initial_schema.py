@@ -0,0 +1,92 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+from geoalchemy2 import Geometry
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by the create_all the application ran at startup
+    # before migrations were introduced already have exactly this schema;
+    # they are adopted as they are and upgraded by the following revisions
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table(
+        "customers"
+    ):
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+
+    op.create_table(
+        "customers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+        sa.Column("api_key", sa.String(), nullable=False, unique=True),
+    )
+    op.create_index("ix_customers_id", "customers", ["id"])
+
+    op.create_table(
+        "road_networks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "customer_id", sa.Integer(), sa.ForeignKey("customers.id"), nullable=False
+        ),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("version", sa.String(), nullable=False),
+        sa.Column("upload_time", sa.TIMESTAMP(timezone=True)),
+        sa.UniqueConstraint(
+            "customer_id", "name", "version", name="uq_customer_name_version"
+        ),
+    )
+    op.create_index("ix_road_networks_id", "road_networks", ["id"])
+    op.create_index("ix_road_networks_name", "road_networks", ["name"])
+
+    op.create_table(
+        "road_edges",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "network_id",
+            sa.Integer(),
+            sa.ForeignKey("road_networks.id"),
+            nullable=False,
+        ),
+        sa.Column("properties", postgresql.JSONB()),
+        sa.Column("geometry", Geometry("LINESTRING", srid=4326, spatial_index=False)),
+        sa.Column("is_current", sa.Boolean()),
+        sa.Column(
+            "valid_from",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column("valid_to", sa.TIMESTAMP(timezone=True)),
+    )
+    op.create_index("ix_road_edges_id", "road_edges", ["id"])
+    op.create_index("ix_road_edges_network_id", "road_edges", ["network_id"])
+    op.create_index("ix_road_edges_valid_from", "road_edges", ["valid_from"])
+    op.create_index("ix_road_edges_valid_to", "road_edges", ["valid_to"])
+    op.create_index(
+        "idx_road_edges_geometry", "road_edges", ["geometry"], postgresql_using="gist"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("road_edges")
+    op.drop_table("road_networks")
+    op.drop_table("customers")
@@ -0,0 +1,111 @@
+"""Hash partition road_edges by network_id
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:10:00
+
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from geoalchemy2 import Geometry
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Fixed when the table is created; see ROAD_EDGES_PARTITIONS in app.models
+ROAD_EDGES_PARTITIONS = int(os.getenv("ROAD_EDGES_PARTITIONS", "8"))
+
+COLUMNS = "id, network_id, properties, geometry, is_current, valid_from, valid_to"
+INDEXES = {
+    "ix_road_edges_id": "id",
+    "ix_road_edges_network_id": "network_id",
+    "ix_road_edges_valid_from": "valid_from",
+    "ix_road_edges_valid_to": "valid_to",
+}
+
+
+def _set_aside_road_edges():
+    # Index, primary key and sequence names are schema wide, so the old table
+    # gives up its names before the new road_edges is created
+    op.rename_table("road_edges", "road_edges_old")
+    op.execute("ALTER SEQUENCE road_edges_id_seq RENAME TO road_edges_old_id_seq")
+    op.execute(
+        "ALTER TABLE road_edges_old RENAME CONSTRAINT road_edges_pkey "
+        "TO road_edges_old_pkey"
+    )
+    for index in [*INDEXES, "idx_road_edges_geometry"]:
+        op.drop_index(index, table_name="road_edges_old")
+
+
+def _create_road_edges(partitioned: bool):
+    op.create_table(
+        "road_edges",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "network_id",
+            sa.Integer(),
+            sa.ForeignKey("road_networks.id"),
+            # The partition key has to be part of the primary key
+            primary_key=partitioned,
+            nullable=False,
+        ),
+        sa.Column("properties", postgresql.JSONB()),
+        sa.Column("geometry", Geometry("LINESTRING", srid=4326, spatial_index=False)),
+        sa.Column("is_current", sa.Boolean()),
+        sa.Column(
+            "valid_from",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column("valid_to", sa.TIMESTAMP(timezone=True)),
+        **({"postgresql_partition_by": "HASH (network_id)"} if partitioned else {}),
+    )
+    for index, column in INDEXES.items():
+        op.create_index(index, "road_edges", [column])
+    op.create_index(
+        "idx_road_edges_geometry", "road_edges", ["geometry"], postgresql_using="gist"
+    )
+    if partitioned:
+        for remainder in range(ROAD_EDGES_PARTITIONS):
+            op.execute(
+                f"CREATE TABLE road_edges_p{remainder} PARTITION OF road_edges "
+                f"FOR VALUES WITH (MODULUS {ROAD_EDGES_PARTITIONS}, "
+                f"REMAINDER {remainder})"
+            )
+
+
+def _move_edges_from_old_table():
+    op.execute(
+        f"INSERT INTO road_edges ({COLUMNS}) SELECT {COLUMNS} FROM road_edges_old"
+    )
+    # Edges keep their ids, so new ones continue after the highest copied id
+    op.execute(
+        "SELECT setval('road_edges_id_seq', "
+        "COALESCE((SELECT max(id) FROM road_edges), 0) + 1, false)"
+    )
+    op.drop_table("road_edges_old")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # An existing table cannot be turned into a partitioned one, so the edges
+    # are copied into a new partitioned road_edges
+    _set_aside_road_edges()
+    _create_road_edges(partitioned=True)
+    _move_edges_from_old_table()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_aside_road_edges()
+    _create_road_edges(partitioned=False)
+    _move_edges_from_old_table()
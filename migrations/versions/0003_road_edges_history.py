@@ -0,0 +1,69 @@
+"""Add road_edges_history
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 09:20:00
+
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from geoalchemy2 import Geometry
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Fixed when the table is created; see ROAD_EDGES_PARTITIONS in app.models
+ROAD_EDGES_PARTITIONS = int(os.getenv("ROAD_EDGES_PARTITIONS", "8"))
+
+COLUMNS = "id, network_id, properties, geometry, is_current, valid_from, valid_to"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "road_edges_history",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column(
+            "network_id",
+            sa.Integer(),
+            sa.ForeignKey("road_networks.id"),
+            primary_key=True,
+        ),
+        sa.Column("properties", postgresql.JSONB()),
+        sa.Column("geometry", Geometry("LINESTRING", srid=4326, spatial_index=False)),
+        sa.Column("is_current", sa.Boolean()),
+        sa.Column("valid_from", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("valid_to", sa.TIMESTAMP(timezone=True), nullable=False),
+        postgresql_partition_by="HASH (network_id)",
+    )
+    table = "road_edges_history"
+    op.create_index(f"ix_{table}_network_id", table, ["network_id"])
+    op.create_index(f"ix_{table}_valid_from", table, ["valid_from"])
+    op.create_index(f"ix_{table}_valid_to", table, ["valid_to"])
+    op.create_index(
+        f"idx_{table}_geometry", table, ["geometry"], postgresql_using="gist"
+    )
+    for remainder in range(ROAD_EDGES_PARTITIONS):
+        op.execute(
+            f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {ROAD_EDGES_PARTITIONS}, REMAINDER {remainder})"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived edges keep their ids, so they go back into road_edges as they were
+    op.execute(
+        f"INSERT INTO road_edges ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM road_edges_history"
+    )
+    # Dropping a partitioned table drops its partitions
+    op.drop_table("road_edges_history")
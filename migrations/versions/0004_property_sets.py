@@ -0,0 +1,113 @@
+"""Move edge properties into interned property_sets
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 09:30:00
+
+"""
+
+import hashlib
+import json
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("road_edges", "road_edges_history")
+BATCH_SIZE = 1000
+
+
+def properties_digest(properties) -> int:
+    # Frozen copy of app.utils.properties_digest; the ids written here must
+    # match the ones the application computes for the same document
+    canonical = json.dumps(
+        properties, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _intern_existing_properties():
+    connection = op.get_bind()
+    insert = sa.text(
+        "INSERT INTO property_sets (id, properties) "
+        "VALUES (:id, CAST(:properties AS JSONB)) ON CONFLICT DO NOTHING"
+    )
+    # SQL NULL properties are interned like a JSON null document
+    rows = [{"id": properties_digest(None), "properties": "null"}]
+    documents = connection.execution_options(stream_results=True).execute(
+        sa.text(
+            " UNION ".join(
+                f"SELECT DISTINCT properties::text FROM {table} "
+                "WHERE properties IS NOT NULL"
+                for table in TABLES
+            )
+        )
+    )
+    for (document,) in documents:
+        rows.append(
+            {"id": properties_digest(json.loads(document)), "properties": document}
+        )
+        if len(rows) >= BATCH_SIZE:
+            connection.execute(insert, rows)
+            rows = []
+    if rows:
+        connection.execute(insert, rows)
+
+    for table in TABLES:
+        # Equal JSONB documents always get the digest of one of their rows
+        op.execute(
+            f"UPDATE {table} AS edges SET property_set_id = property_sets.id "
+            "FROM property_sets WHERE edges.properties = property_sets.properties"
+        )
+        op.execute(
+            f"UPDATE {table} SET property_set_id = {properties_digest(None)} "
+            "WHERE properties IS NULL"
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "property_sets",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column("properties", postgresql.JSONB()),
+    )
+    for table in TABLES:
+        op.add_column(table, sa.Column("property_set_id", sa.BigInteger()))
+
+    # Digests are computed in Python so they match properties_digest exactly
+    _intern_existing_properties()
+
+    for table in TABLES:
+        op.alter_column(table, "property_set_id", nullable=False)
+        op.create_foreign_key(
+            f"{table}_property_set_id_fkey",
+            table,
+            "property_sets",
+            ["property_set_id"],
+            ["id"],
+        )
+        op.create_index(f"ix_{table}_property_set_id", table, ["property_set_id"])
+        op.drop_column(table, "properties")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column("properties", postgresql.JSONB()))
+        op.execute(
+            f"UPDATE {table} AS edges SET properties = property_sets.properties "
+            "FROM property_sets WHERE property_sets.id = edges.property_set_id"
+        )
+        op.drop_index(f"ix_{table}_property_set_id", table_name=table)
+        op.drop_constraint(f"{table}_property_set_id_fkey", table, type_="foreignkey")
+        op.drop_column(table, "property_set_id")
+    op.drop_table("property_sets")
@@ -0,0 +1,47 @@
+"""Add road network stats
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 10:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing networks are backfilled with `python -m app.maintenance stats`
+    op.create_table(
+        "road_network_stats",
+        sa.Column(
+            "network_id",
+            sa.Integer(),
+            sa.ForeignKey("road_networks.id"),
+            primary_key=True,
+        ),
+        sa.Column("version", sa.String(), primary_key=True),
+        sa.Column("edge_count", sa.Integer(), nullable=False),
+        sa.Column("total_length_m", sa.Float(), nullable=False),
+        sa.Column("min_x", sa.Float()),
+        sa.Column("min_y", sa.Float()),
+        sa.Column("max_x", sa.Float()),
+        sa.Column("max_y", sa.Float()),
+        sa.Column("property_counts", postgresql.JSONB(), nullable=False),
+        sa.Column("computed_at", sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("road_network_stats")
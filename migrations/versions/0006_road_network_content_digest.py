@@ -0,0 +1,28 @@
+"""Add road network content digest
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 11:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("road_networks", sa.Column("content_digest", sa.String()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("road_networks", "content_digest")
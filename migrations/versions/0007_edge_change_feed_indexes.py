@@ -0,0 +1,36 @@
+"""Add change feed indexes on edge validity
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 12:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("road_edges", "road_edges_history")
+COLUMNS = ("valid_from", "valid_to")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.create_index(
+                f"ix_{table}_network_id_{column}", table, ["network_id", column]
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.drop_index(f"ix_{table}_network_id_{column}", table_name=table)
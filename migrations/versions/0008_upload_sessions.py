@@ -0,0 +1,39 @@
+"""Add upload sessions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 13:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "upload_sessions",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column(
+            "customer_id", sa.Integer(), sa.ForeignKey("customers.id"), nullable=False
+        ),
+        sa.Column("network_id", sa.Integer(), sa.ForeignKey("road_networks.id")),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("upload_sessions")
@@ -0,0 +1,33 @@
+"""Add GIN index on property sets
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 14:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_property_sets_properties",
+        "property_sets",
+        ["properties"],
+        postgresql_using="gin",
+        postgresql_ops={"properties": "jsonb_path_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_property_sets_properties", table_name="property_sets")
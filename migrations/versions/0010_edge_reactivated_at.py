@@ -0,0 +1,38 @@
+"""Add reactivated_at to edges for the change feed
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 16:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("road_edges", "road_edges_history")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column("reactivated_at", sa.TIMESTAMP(timezone=True)))
+        op.create_index(
+            f"ix_{table}_network_id_reactivated_at",
+            table,
+            ["network_id", "reactivated_at"],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_network_id_reactivated_at", table_name=table)
+        op.drop_column(table, "reactivated_at")
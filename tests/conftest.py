@@ -7,7 +7,7 @@ from shapely.geometry import shape
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
 from app.main import app
 from app.models import Customer, RoadEdge, RoadNetwork
 
@@ -39,6 +39,7 @@ def client(db):
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     yield TestClient(app)
 
 
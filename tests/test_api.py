@@ -1,5 +1,6 @@
 import io
 import json
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -7,9 +8,26 @@ from fastapi import status
 from geoalchemy2.shape import to_shape
 from shapely.geometry import mapping
 
-from app.crud import create_road_network
-from app.models import Customer, RoadEdge, RoadNetwork
-from app.schemas import RoadNetworkObject
+from app.crud import (
+    archive_superseded_edges,
+    create_road_network,
+    expire_upload_sessions,
+    purge_edge_history,
+    purge_unused_property_sets,
+)
+from app.database import get_read_db
+from app.main import app
+from app.models import (
+    Customer,
+    PropertySet,
+    RoadEdge,
+    RoadEdgeHistory,
+    RoadNetwork,
+    RoadNetworkStats,
+    UploadSession,
+)
+from app.schemas import SNAP_MAX_POINTS, RoadNetworkObject
+from app.slow_queries import reset_slow_queries
 
 geojson_content = {
     "type": "FeatureCollection",
@@ -181,6 +199,31 @@ def test_update_network_same_data(
     assert existing_edge.is_current is True
 
 
+def test_update_network_unchanged_file(client, db, customer):
+    content = json.dumps(geojson_content).encode("utf-8")
+    for method, url, filename in [
+        ("post", "/api/road-networks/", "road_network_testnet_1.0.geojson"),
+        ("put", "/api/road-networks/{id}", "road_network_testnet_1.1.geojson"),
+    ]:
+        network = db.query(RoadNetwork).filter(RoadNetwork.name == "testnet").first()
+        response = client.request(
+            method,
+            url.format(id=network.id if network else None),
+            headers={"x-api-key": customer.api_key},
+            files={"file": (filename, io.BytesIO(content), "application/json")},
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    db.expire_all()
+    edges = db.query(RoadEdge).filter(RoadEdge.network_id == network.id).all()
+    assert response.json()["version"] == "1.1"
+    assert len(edges) == 1
+    assert edges[0].is_current is True
+    assert edges[0].valid_to is None
+    stats = db.get(RoadNetworkStats, (network.id, "1.1"))
+    assert stats.edge_count == 1
+
+
 @patch("app.utils.load_geojson_file", return_value=geojson_content)
 def test_update_network_with_same_version(
     mock_load_geojson, client, db, customer, road_network
@@ -201,6 +244,107 @@ def test_update_network_with_same_version(
     )
 
 
+# --- /api/uploads/ ---
+def test_resumable_upload(client, db, customer, monkeypatch, tmp_path):
+    monkeypatch.setattr("app.uploads.UPLOAD_DIR", str(tmp_path))
+    headers = {"x-api-key": customer.api_key}
+    content = json.dumps(geojson_content).encode("utf-8")
+
+    response = client.post(
+        "/api/uploads/",
+        headers=headers,
+        json={"filename": "road_network_testnet_1.0.geojson"},
+    )
+    upload_id = response.json()["id"]
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["offset"] == 0
+
+    chunk_headers = {**headers, "content-type": "application/octet-stream"}
+    response = client.put(
+        f"/api/uploads/{upload_id}?offset=0",
+        headers=chunk_headers,
+        content=content[:10],
+    )
+    assert response.json()["offset"] == 10
+    # A chunk at the wrong offset is rejected; the client resumes at the status
+    response = client.put(
+        f"/api/uploads/{upload_id}?offset=5", headers=chunk_headers, content=content[5:]
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    offset = client.get(f"/api/uploads/{upload_id}", headers=headers).json()["offset"]
+    client.put(
+        f"/api/uploads/{upload_id}?offset={offset}",
+        headers=chunk_headers,
+        content=content[offset:],
+    )
+
+    response = client.post(f"/api/uploads/{upload_id}/commit", headers=headers)
+    road_network = db.query(RoadNetwork).filter(RoadNetwork.name == "testnet").one()
+    edges = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).all()
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == road_network.id
+    assert len(edges) == 1
+    assert list(tmp_path.iterdir()) == []
+    response = client.get(f"/api/uploads/{upload_id}", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_upload_chunk_too_large(client, db, customer, monkeypatch, tmp_path):
+    monkeypatch.setattr("app.uploads.UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr("app.uploads.UPLOAD_MAX_CHUNK_BYTES", 4)
+    headers = {"x-api-key": customer.api_key}
+    upload_id = client.post(
+        "/api/uploads/",
+        headers=headers,
+        json={"filename": "road_network_testnet_1.0.geojson"},
+    ).json()["id"]
+
+    response = client.put(
+        f"/api/uploads/{upload_id}?offset=0",
+        headers={**headers, "content-type": "application/octet-stream"},
+        content=b"hello",
+    )
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert (
+        client.get(f"/api/uploads/{upload_id}", headers=headers).json()["offset"] == 0
+    )
+
+
+def test_expire_upload_sessions(client, db, customer, monkeypatch, tmp_path):
+    monkeypatch.setattr("app.uploads.UPLOAD_DIR", str(tmp_path))
+    headers = {"x-api-key": customer.api_key}
+    upload_ids = [
+        client.post(
+            "/api/uploads/",
+            headers=headers,
+            json={"filename": "road_network_testnet_1.0.geojson"},
+        ).json()["id"]
+        for _ in range(2)
+    ]
+    for upload_id in upload_ids:
+        client.put(
+            f"/api/uploads/{upload_id}?offset=0",
+            headers={**headers, "content-type": "application/octet-stream"},
+            content=b"hello",
+        )
+    stale = db.get(UploadSession, upload_ids[0])
+    stale.updated_at = datetime(2025, 1, 1)
+    db.commit()
+
+    assert expire_upload_sessions(db, datetime(2025, 1, 2)) == 1
+    assert db.query(UploadSession).count() == 1
+    assert [path.name for path in tmp_path.iterdir()] == [f"{upload_ids[1]}.part"]
+
+
+def test_resumable_upload_invalid_filename(client, db, customer):
+    response = client.post(
+        "/api/uploads/",
+        headers={"x-api-key": customer.api_key},
+        json={"filename": "network.json"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 # --- GET /api/road-networks/{road_network_id} ---
 def test_get_network(client, db, customer, road_network):
     response = client.get(
@@ -255,3 +399,353 @@ def test_get_network_invalid_query_time(client, customer, road_network, mock_log
     )
     assert mock_logger.warning.call_count == 1
     assert mock_logger.warning.call_args[0][0] == "Invalid query time format: %s"
+
+
+def test_get_network_uses_read_session(client, db, customer, road_network):
+    sessions = []
+
+    def override_get_read_db():
+        sessions.append(db)
+        yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    response = client.get(
+        f"/api/road-networks/{road_network.id}", headers={"x-api-key": customer.api_key}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert sessions == [db]
+
+
+def test_get_network_keeps_openapi_schema():
+    responses = app.openapi()["paths"]["/api/road-networks/{road_network_id}"]["get"][
+        "responses"
+    ]
+    schema = responses["200"]["content"]["application/json"]["schema"]
+    assert schema == {"$ref": "#/components/schemas/GeoJSONFeatureCollection"}
+
+
+def test_get_network_property_filter(client, db, customer, road_network):
+    for highway, valid_from in [
+        ("motorway", datetime(2025, 1, 1, 10, 30)),
+        ("residential", datetime(2025, 1, 1, 10, 30)),
+        ("primary", datetime(2025, 1, 10, 10, 30)),
+    ]:
+        db.add(
+            RoadEdge(
+                network_id=road_network.id,
+                properties={"highway": highway, "maxspeed": 50},
+                geometry="SRID=4326;LINESTRING(0 0, 2 2)",
+                valid_from=valid_from,
+            )
+        )
+    db.commit()
+
+    response = client.get(
+        f"/api/road-networks/{road_network.id}",
+        params={
+            "property": ["highway:motorway,primary", "maxspeed:50"],
+            "query_time": "2025-01-05 00:00:00",
+        },
+        headers={"x-api-key": customer.api_key},
+    )
+    features = response.json()["features"]
+    assert response.status_code == status.HTTP_200_OK
+    assert [feature["properties"]["highway"] for feature in features] == ["motorway"]
+
+
+# --- GET /api/road-networks/{road_network_id}/changes ---
+def test_get_changes(client, db, customer, road_network):
+    old_edge = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).one()
+    old_edge.is_current = False
+    old_edge.valid_to = datetime(2025, 1, 5, 10, 30)
+    new_edge = RoadEdge(
+        network_id=road_network.id,
+        properties={"name": "New Road"},
+        geometry="SRID=4326;LINESTRING(0 0, 2 2)",
+        valid_from=datetime(2025, 1, 5, 10, 30, 1),
+    )
+    db.add(new_edge)
+    db.commit()
+
+    response = client.get(
+        f"/api/road-networks/{road_network.id}/changes?since=2025-01-02 00:00:00",
+        headers={"x-api-key": customer.api_key},
+    )
+    changes = response.json()["changes"]
+    assert response.status_code == status.HTTP_200_OK
+    assert [(change["change"], change["edge_id"]) for change in changes] == [
+        ("removed", old_edge.id),
+        ("added", new_edge.id),
+    ]
+    assert changes[1]["feature"]["properties"] == {"name": "New Road"}
+
+    next_since = response.json()["next_since"]
+    response = client.get(
+        f"/api/road-networks/{road_network.id}/changes",
+        params={"since": next_since},
+        headers={"x-api-key": customer.api_key},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["changes"] == []
+    assert response.json()["next_since"] == next_since
+
+
+def test_get_changes_reactivated_edge(client, db, customer, road_network):
+    old_edge = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).one()
+
+    def put_version(version, content):
+        response = client.put(
+            f"/api/road-networks/{road_network.id}",
+            headers={"x-api-key": customer.api_key},
+            files={
+                "file": (
+                    f"road_network_testnet_{version}.geojson",
+                    io.BytesIO(json.dumps(content).encode("utf-8")),
+                    "application/json",
+                )
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    def poll(since):
+        response = client.get(
+            f"/api/road-networks/{road_network.id}/changes",
+            params={"since": since},
+            headers={"x-api-key": customer.api_key},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    # Version 1.1 removes the edge, 1.2 brings it back
+    put_version("1.1", updated_geojson_content)
+    removed = poll("2025-01-02 00:00:00")
+    assert ("removed", old_edge.id) in [
+        (change["change"], change["edge_id"]) for change in removed["changes"]
+    ]
+
+    put_version("1.2", geojson_content)
+    changes = poll(removed["next_since"])["changes"]
+    new_edge_id = next(
+        change["edge_id"]
+        for change in removed["changes"]
+        if change["change"] == "added"
+    )
+    assert [(change["change"], change["edge_id"]) for change in changes] == [
+        ("removed", new_edge_id),
+        ("added", old_edge.id),
+    ]
+    assert changes[1]["feature"]["properties"] == {"name": "Test Road"}
+
+
+def test_get_changes_after_partial_update(client, db, customer, road_network):
+    kept_edge = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).one()
+    removed_edge = RoadEdge(
+        network_id=road_network.id,
+        properties={"name": "Old Road"},
+        geometry="SRID=4326;LINESTRING(5 5, 6 6)",
+        valid_from=datetime(2025, 1, 1, 10, 30),
+    )
+    db.add(removed_edge)
+    db.commit()
+    content = {
+        "type": "FeatureCollection",
+        "features": [
+            geojson_content["features"][0],
+            {
+                "type": "Feature",
+                "properties": {"name": "New Road"},
+                "geometry": {"type": "LineString", "coordinates": [[7, 7], [8, 8]]},
+            },
+        ],
+    }
+    response = client.put(
+        f"/api/road-networks/{road_network.id}",
+        headers={"x-api-key": customer.api_key},
+        files={
+            "file": (
+                "road_network_testnet_1.1.geojson",
+                io.BytesIO(json.dumps(content).encode("utf-8")),
+                "application/json",
+            )
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get(
+        f"/api/road-networks/{road_network.id}/changes?since=2025-01-02 00:00:00",
+        headers={"x-api-key": customer.api_key},
+    )
+    changes = response.json()["changes"]
+    # The unchanged edge is carried over without being reported
+    assert [change["change"] for change in changes] == ["removed", "added"]
+    assert changes[0]["edge_id"] == removed_edge.id
+    assert changes[1]["feature"]["properties"] == {"name": "New Road"}
+    assert kept_edge.id not in [change["edge_id"] for change in changes]
+
+
+def test_get_changes_invalid_since(client, customer, road_network):
+    response = client.get(
+        f"/api/road-networks/{road_network.id}/changes?since=yesterday",
+        headers={"x-api-key": customer.api_key},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# --- POST /api/road-networks/{road_network_id}/snap ---
+def test_snap_points(client, db, customer, road_network):
+    response = client.post(
+        f"/api/road-networks/{road_network.id}/snap",
+        headers={"x-api-key": customer.api_key},
+        json={"points": [[0, 1], [40, 40]], "max_distance": 1.0},
+    )
+    edge = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).first()
+    results = response.json()["results"]
+    assert response.status_code == status.HTTP_200_OK
+    assert len(results) == 2
+    assert results[0]["edge_id"] == edge.id
+    assert results[0]["coordinates"] == [0.5, 0.5]
+    assert results[1]["edge_id"] is None
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"points": [[0, 1]], "max_distance": 0},
+        {"points": [[0, 1]], "max_distance": -1},
+        {"points": [[0, 1]] * (SNAP_MAX_POINTS + 1)},
+    ],
+)
+def test_snap_points_invalid_request(client, customer, road_network, body):
+    response = client.post(
+        f"/api/road-networks/{road_network.id}/snap",
+        headers={"x-api-key": customer.api_key},
+        json=body,
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# --- GET /api/road-networks/{road_network_id}/stats ---
+def test_get_network_stats(client, db, customer):
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"highway": highway},
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+            }
+            for highway, coordinates in [
+                ("primary", [[0, 0], [0, 1]]),
+                ("primary", [[0, 1], [1, 1]]),
+                ("residential", [[1, 1], [1, 2]]),
+            ]
+        ],
+    }
+    network = create_road_network(
+        db, RoadNetworkObject(name="statsnet", geojson=geojson), customer.id
+    )
+    response = client.get(
+        f"/api/road-networks/{network.id}/stats",
+        headers={"x-api-key": customer.api_key},
+    )
+    stats = response.json()
+    assert response.status_code == status.HTTP_200_OK
+    assert stats["version"] == "1.0"
+    assert stats["edge_count"] == 3
+    # One degree of latitude is about 111 km
+    assert stats["total_length_m"] == pytest.approx(3 * 111_000, rel=0.01)
+    assert stats["bbox"] == [0, 0, 1, 2]
+    assert stats["property_counts"] == {"highway": {"primary": 2, "residential": 1}}
+
+
+def test_get_network_stats_not_computed(client, db, customer, road_network):
+    response = client.get(
+        f"/api/road-networks/{road_network.id}/stats",
+        headers={"x-api-key": customer.api_key},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_network_query_time_from_history(client, db, customer, road_network):
+    edge = db.query(RoadEdge).filter(RoadEdge.network_id == road_network.id).first()
+    edge.is_current = False
+    edge.valid_to = datetime(2025, 1, 5, 10, 30)
+    db.commit()
+
+    archived = archive_superseded_edges(db, datetime.now())
+    response = client.get(
+        f"/api/road-networks/{road_network.id}?query_time=2025-01-02 10:31:00",
+        headers={"x-api-key": customer.api_key},
+    )
+    assert archived == 1
+    assert db.query(RoadEdge).count() == 0
+    assert db.query(RoadEdgeHistory).count() == 1
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["features"][0]["geometry"]["coordinates"] == [[0, 0], [1, 1]]
+
+    # The history edge still refers to its property set
+    assert purge_unused_property_sets(db) == 0
+    purged = purge_edge_history(db, datetime(2025, 2, 1))
+    assert purged == 1
+    assert db.query(RoadEdgeHistory).count() == 0
+    assert purge_unused_property_sets(db) == 1
+    assert db.query(PropertySet).count() == 0
+
+
+# --- GET /metrics ---
+def test_metrics(client, db, customer, road_network):
+    client.get(
+        f"/api/road-networks/{road_network.id}", headers={"x-api-key": customer.api_key}
+    )
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert (
+        'road_network_stage_seconds_count{route="/api/road-networks/{road_network_id}",'
+        'stage="serialize"}' in response.text
+    )
+    assert "road_network_db_seconds" in response.text
+
+
+# --- Profiling ---
+def test_profiled_request(client, db, customer, road_network, monkeypatch, tmp_path):
+    monkeypatch.setattr("app.utils.ADMIN_TOKEN", "admintoken")
+    monkeypatch.setattr("app.profiling.PROFILE_DIR", str(tmp_path))
+    admin_headers = {"x-admin-token": "admintoken"}
+    response = client.get(
+        f"/api/road-networks/{road_network.id}",
+        headers={"x-api-key": customer.api_key, "x-profile": "1", **admin_headers},
+    )
+    profile_id = response.headers["x-profile-id"]
+    profile = client.get(f"/internal/profiles/{profile_id}", headers=admin_headers)
+    sql = client.get(f"/internal/profiles/{profile_id}/sql", headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert profile.status_code == status.HTTP_200_OK
+    assert sql.json()["profiled"] is True
+    assert len(sql.json()["statements"]) > 0
+
+
+def test_profiles_require_admin_token(client, monkeypatch):
+    monkeypatch.setattr("app.utils.ADMIN_TOKEN", "admintoken")
+    response = client.get("/internal/profiles", headers={"x-admin-token": "wrong"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert response.json()["detail"] == "Invalid admin token"
+
+
+# --- GET /internal/slow-queries ---
+def test_slow_queries_capture_plans(client, db, customer, road_network, monkeypatch):
+    monkeypatch.setattr("app.utils.ADMIN_TOKEN", "admintoken")
+    monkeypatch.setattr("app.slow_queries.SLOW_QUERY_THRESHOLD_MS", 0)
+    reset_slow_queries()
+    client.get(
+        f"/api/road-networks/{road_network.id}", headers={"x-api-key": customer.api_key}
+    )
+    response = client.get(
+        "/internal/slow-queries", headers={"x-admin-token": "admintoken"}
+    )
+    edge_query = next(
+        stats for stats in response.json() if "FROM road_edges" in stats["statement"]
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert edge_query["count"] >= 1
+    assert edge_query["plan"][0]["Plan"]
+    reset_slow_queries()
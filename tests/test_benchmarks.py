@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from benchmarks.generate import change_network, grid_network, random_network
+from benchmarks.run import Benchmark
+
+
+def test_grid_network_size_and_determinism():
+    network = grid_network(1000, seed=1)
+    assert len(network["features"]) == 1000
+    assert network == grid_network(1000, seed=1)
+
+
+def test_random_network_size():
+    network = random_network(500)
+    assert len(network["features"]) == 500
+    assert all(
+        len(feature["geometry"]["coordinates"]) >= 2 for feature in network["features"]
+    )
+
+
+def test_change_network_ratio():
+    network = grid_network(1000)
+    changed = change_network(network, 0.1)
+    differing = sum(
+        old != new for old, new in zip(network["features"], changed["features"])
+    )
+    assert differing == 100
+    assert change_network(network, 0.0) == network
+
+
+def response(size: int) -> SimpleNamespace:
+    return SimpleNamespace(content=b"x" * size, raise_for_status=lambda: None)
+
+
+def test_peak_rss_is_measured_per_step():
+    benchmark = Benchmark(None, repeat=1)
+    # The first step touches 64 MiB that is freed before the second one
+    benchmark.measure("big", lambda: response(64 << 20))
+    benchmark.measure("small", lambda: response(0))
+    big_step, small_step = benchmark.results
+    assert small_step["peak_rss_mb"] < big_step["peak_rss_mb"] - 32
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from app.bulk_import import import_networks, parse_network_file, plan_imports
+from app.models import RoadEdge, RoadNetwork
+
+
+def write_network(directory, name, version, coordinates):
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"name": "Test Road"},
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+            }
+        ],
+    }
+    path = directory / f"road_network_{name}_{version}.geojson"
+    path.write_text(json.dumps(geojson))
+    return path
+
+
+def test_plan_imports_orders_versions(tmp_path):
+    for version in ["1.10", "1.2", "1.9"]:
+        write_network(tmp_path, "alps", version, [[0, 0], [1, 1]])
+    write_network(tmp_path, "coast", "1.0", [[0, 0], [1, 1]])
+    (tmp_path / "notes.geojson").write_text("{}")
+
+    plan = plan_imports([str(tmp_path)])
+    assert [version for version, _ in plan["alps"]] == ["1.2", "1.9", "1.10"]
+    assert [version for version, _ in plan["coast"]] == ["1.0"]
+
+
+def test_parse_network_file(tmp_path):
+    path = write_network(tmp_path, "alps", "1.0", [[0, 0], [1, 1]])
+    content_digest, edges = parse_network_file(str(path))
+    assert len(content_digest) == 64
+    assert len(edges) == 1
+    assert edges[0]["properties"] == {"name": "Test Road"}
+
+
+def test_parse_network_file_invalid(tmp_path):
+    path = tmp_path / "road_network_alps_1.0.geojson"
+    path.write_text("{not json")
+    with pytest.raises(ValueError, match="not a valid GeoJSON"):
+        parse_network_file(str(path))
+
+
+def test_import_networks_invalid_file(db, customer, tmp_path):
+    write_network(tmp_path, "alps", "1.0", [[0, 0], [1, 1]])
+    (tmp_path / "road_network_broken_1.0.geojson").write_text("{not json")
+    write_network(tmp_path, "coast", "1.0", [[5, 5], [6, 6]])
+    write_network(tmp_path, "fjord", "1.0", [[7, 7], [8, 8]])
+
+    progress = import_networks([str(tmp_path)], customer.id, connections=1)
+    assert (progress.imported, progress.skipped, progress.failed) == (3, 0, 1)
+    names = {network.name for network in db.query(RoadNetwork).all()}
+    assert names == {"alps", "coast", "fjord"}
+
+
+def test_import_networks_resumes(db, customer, tmp_path):
+    write_network(tmp_path, "alps", "1.0", [[0, 0], [1, 1]])
+    write_network(tmp_path, "alps", "1.1", [[0, 0], [2, 2]])
+    write_network(tmp_path, "coast", "1.0", [[5, 5], [6, 6]])
+
+    progress = import_networks([str(tmp_path)], customer.id, connections=2)
+    assert (progress.imported, progress.skipped, progress.failed) == (3, 0, 0)
+    alps = db.query(RoadNetwork).filter(RoadNetwork.name == "alps").one()
+    current = (
+        db.query(RoadEdge)
+        .filter(RoadEdge.network_id == alps.id, RoadEdge.is_current == True)
+        .all()
+    )
+    assert alps.version == "1.1"
+    assert len(current) == 1
+
+    write_network(tmp_path, "alps", "1.2", [[0, 0], [3, 3]])
+    progress = import_networks([str(tmp_path)], customer.id, connections=2)
+    assert (progress.imported, progress.skipped, progress.failed) == (1, 3, 0)
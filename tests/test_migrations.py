@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+
+from app.utils import properties_digest
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL", "postgresql://postgres:postgres@db:5432/road_network"
+)
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic.ini")
+
+
+@pytest.fixture
+def alembic_config():
+    engine = create_engine(DATABASE_URL)
+    config = Config(ALEMBIC_INI)
+    yield config, engine
+    command.downgrade(config, "base")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    engine.dispose()
+
+
+def test_migrations_upgrade_and_downgrade(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "head")
+
+    tables = set(inspect(engine).get_table_names())
+    assert {
+        "customers",
+        "road_networks",
+        "property_sets",
+        "road_edges",
+        "road_edges_history",
+        "road_network_stats",
+    } <= tables
+    assert "road_edges_p0" in tables
+
+    command.downgrade(config, "base")
+    assert "road_edges" not in inspect(engine).get_table_names()
+
+
+def test_migrations_upgrade_existing_data(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "0001")
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO customers (id, name, api_key) VALUES (1, 'c', 'k')")
+        )
+        conn.execute(
+            text(
+                "INSERT INTO road_networks (id, customer_id, name, version) "
+                "VALUES (1, 1, 'n', '1.0')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO road_edges (network_id, properties, geometry, is_current) "
+                'VALUES (1, \'{"name": "a"}\', '
+                "ST_GeomFromText('LINESTRING(0 0, 1 1)', 4326), true), "
+                '(1, \'{"name": "a"}\', '
+                "ST_GeomFromText('LINESTRING(1 1, 2 2)', 4326), true), "
+                "(1, NULL, ST_GeomFromText('LINESTRING(2 2, 3 3)', 4326), true)"
+            )
+        )
+
+    command.upgrade(config, "head")
+
+    with engine.connect() as conn:
+        edges = conn.execute(
+            text(
+                "SELECT road_edges.id, property_sets.properties FROM road_edges "
+                "JOIN property_sets ON property_sets.id = road_edges.property_set_id "
+                "ORDER BY road_edges.id"
+            )
+        ).all()
+        property_sets = conn.execute(text("SELECT id FROM property_sets")).scalars()
+        # New edges continue after the ids copied into the partitioned table
+        next_id = conn.execute(text("SELECT nextval('road_edges_id_seq')")).scalar()
+    assert [properties for _, properties in edges] == [
+        {"name": "a"},
+        {"name": "a"},
+        None,
+    ]
+    assert set(property_sets) == {
+        properties_digest({"name": "a"}),
+        properties_digest(None),
+    }
+    assert next_id > edges[-1][0]
+
+    command.downgrade(config, "0001")
+    with engine.connect() as conn:
+        properties = conn.execute(
+            text("SELECT properties FROM road_edges ORDER BY id")
+        ).scalars()
+        assert list(properties) == [{"name": "a"}, {"name": "a"}, None]
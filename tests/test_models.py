@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 
 from app import models
@@ -62,3 +63,40 @@ def test_road_edge_insert_and_relationship(db):
     assert result.network_id == network.id
     assert result.properties["speed"] == 50
     assert result.is_current is True
+
+
+def test_road_edges_hash_partitions(db):
+    partitions = db.execute(
+        text(
+            "SELECT count(*) FROM pg_inherits "
+            "WHERE inhparent = 'road_edges'::regclass"
+        )
+    ).scalar()
+    assert partitions == models.ROAD_EDGES_PARTITIONS
+
+
+def test_road_edges_share_interned_property_set(db):
+    customer = models.Customer(name="PropsCustomer", api_key="propskey")
+    db.add(customer)
+    db.commit()
+
+    network = models.RoadNetwork(
+        customer_id=customer.id, name="PropsNet", version="1.0"
+    )
+    db.add(network)
+    db.commit()
+
+    for coordinates in ("0 0, 1 1", "1 1, 2 2"):
+        db.add(
+            models.RoadEdge(
+                network_id=network.id,
+                properties={"highway": "primary"},
+                geometry=f"LINESTRING({coordinates})",
+            )
+        )
+    db.commit()
+
+    edges = db.query(models.RoadEdge).all()
+    assert db.query(models.PropertySet).count() == 1
+    assert edges[0].property_set_id == edges[1].property_set_id
+    assert edges[0].properties == {"highway": "primary"}
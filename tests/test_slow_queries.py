@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import slow_queries
+from app.main import app  # noqa: F401
+from app.models import Customer
+
+
+@pytest.fixture
+def observed_engine(monkeypatch):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_THRESHOLD_MS", 0)
+    # app.main instruments every engine, so a fresh one is observed too
+    engine = create_engine("sqlite://")
+    slow_queries.reset_slow_queries()
+    yield engine
+    slow_queries.reset_slow_queries()
+
+
+def test_fingerprint_folds_placeholders():
+    statement = "SELECT *\nFROM t WHERE id IN (%(id_1)s, %(id_2)s) AND name = %(name)s"
+    assert (
+        slow_queries.fingerprint(statement)
+        == "SELECT * FROM t WHERE id IN (?, ...) AND name = ?"
+    )
+
+
+def test_slow_queries_are_aggregated_without_values(observed_engine):
+    with observed_engine.connect() as conn:
+        for value in ("secret-1", "secret-2"):
+            conn.execute(text("SELECT :value"), {"value": value})
+
+    report = slow_queries.slow_query_report()
+    assert len(report) == 1
+    assert report[0]["count"] == 2
+    assert report[0]["parameters"] == ["value"]
+    assert "secret" not in str(report)
+
+
+def test_fast_queries_are_ignored(observed_engine, monkeypatch):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_THRESHOLD_MS", 60_000)
+    with observed_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert slow_queries.slow_query_report() == []
+
+
+def test_scrub_plan_removes_constants():
+    plan = [
+        {
+            "Plan": {
+                "Node Type": "Index Scan",
+                "Relation Name": "road_edges_p0",
+                "Index Cond": "((api_key)::text = 'it''s-secret'::text)",
+                "Filter": "(network_id = 42)",
+                "Actual Rows": 1,
+            }
+        }
+    ]
+    scrubbed = slow_queries.scrub_plan(plan)
+    assert scrubbed[0]["Plan"]["Index Cond"] == "((api_key)::text = ?::text)"
+    assert scrubbed[0]["Plan"]["Filter"] == "(network_id = ?)"
+    assert scrubbed[0]["Plan"]["Relation Name"] == "road_edges_p0"
+    assert scrubbed[0]["Plan"]["Actual Rows"] == 1
+
+
+def test_slow_query_plans_without_values(db, customer, monkeypatch):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_THRESHOLD_MS", 0)
+    slow_queries.reset_slow_queries()
+    db.query(Customer).filter(Customer.api_key == customer.api_key).one()
+
+    report = slow_queries.slow_query_report()
+    slow_queries.reset_slow_queries()
+    assert any(stats["plan"] for stats in report)
+    assert customer.api_key not in str(report)
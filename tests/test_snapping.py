@@ -0,0 +1,52 @@
+import pytest
+from shapely.geometry import LineString
+
+from app.snapping import EdgeIndex, clear_edge_index_cache, get_cached_edge_index
+
+
+@pytest.fixture
+def edge_index():
+    geometries = [
+        LineString([(0, 0), (2, 0)]).wkb,
+        LineString([(0, 5), (0, 10)]).wkb,
+    ]
+    return EdgeIndex([11, 22], geometries)
+
+
+def test_snap_points_to_nearest_edge(edge_index):
+    results = edge_index.snap([(1, 1), (1, 7)])
+    assert results[0]["edge_id"] == 11
+    assert results[0]["distance"] == pytest.approx(1.0)
+    assert results[0]["location"] == pytest.approx(0.5)
+    assert results[0]["coordinates"] == pytest.approx([1.0, 0.0])
+    assert results[1]["edge_id"] == 22
+    assert results[1]["coordinates"] == pytest.approx([0.0, 7.0])
+
+
+def test_snap_points_beyond_max_distance(edge_index):
+    results = edge_index.snap([(1, 0.5), (50, 50)], max_distance=1.0)
+    assert results[0]["edge_id"] == 11
+    assert results[1] == {
+        "edge_id": None,
+        "distance": None,
+        "location": None,
+        "coordinates": None,
+    }
+
+
+def test_snap_empty_batch(edge_index):
+    assert edge_index.snap([]) == []
+
+
+def test_edge_index_cache_reuses_index(edge_index):
+    clear_edge_index_cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return edge_index
+
+    assert get_cached_edge_index((1, "1.0"), loader) is edge_index
+    assert get_cached_edge_index((1, "1.0"), loader) is edge_index
+    assert len(calls) == 1
+    clear_edge_index_cache()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Request
+
+from app import uploads
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_write_chunks_in_order():
+    assert uploads.write_chunk("abc", 0, b"hello ") == 6
+    assert uploads.write_chunk("abc", 6, b"world") == 11
+    with open(uploads.upload_path("abc"), "rb") as file:
+        assert file.read() == b"hello world"
+
+
+def test_write_chunk_replaces_unrecorded_bytes():
+    uploads.write_chunk("abc", 0, b"hello ")
+    # A retried chunk overwrites whatever an interrupted attempt left behind
+    uploads.write_chunk("abc", 6, b"wor")
+    assert uploads.write_chunk("abc", 6, b"there") == 11
+    with open(uploads.upload_path("abc"), "rb") as file:
+        assert file.read() == b"hello there"
+
+
+def test_write_chunk_too_large(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_CHUNK_BYTES", 4)
+    with pytest.raises(HTTPException) as exc_info:
+        uploads.write_chunk("abc", 0, b"hello")
+    assert exc_info.value.status_code == 413
+
+
+def test_remove_upload(upload_dir):
+    uploads.write_chunk("abc", 0, b"hello")
+    uploads.remove_upload("abc")
+    uploads.remove_upload("abc")
+    assert list(upload_dir.iterdir()) == []
+
+
+def chunk_request(parts: list[bytes], content_length: int = None) -> Request:
+    messages = [
+        {"type": "http.request", "body": part, "more_body": i < len(parts) - 1}
+        for i, part in enumerate(parts)
+    ]
+    headers = []
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "headers": headers, "path_params": {"upload_id": "abc"}}
+    return Request(scope, receive)
+
+
+def test_read_chunk():
+    request = chunk_request([b"hello ", b"world"], content_length=11)
+    assert asyncio.run(uploads.read_chunk(request)) == b"hello world"
+
+
+def test_read_chunk_rejects_content_length_before_reading(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_CHUNK_BYTES", 4)
+    request = chunk_request([b"hello"], content_length=5)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(uploads.read_chunk(request))
+    assert exc_info.value.status_code == 413
+    assert asyncio.run(request.receive())["body"] == b"hello"
+
+
+def test_read_chunk_without_content_length_too_large(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_CHUNK_BYTES", 4)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(uploads.read_chunk(chunk_request([b"hel", b"lo"])))
+    assert exc_info.value.status_code == 413
+
+
+def test_remove_stale_uploads(upload_dir):
+    for upload_id in ("stale", "live", "recent"):
+        uploads.write_chunk(upload_id, 0, b"hello")
+    hour_ago = (datetime.now() - timedelta(hours=1)).timestamp()
+    for upload_id in ("stale", "live"):
+        os.utime(uploads.upload_path(upload_id), (hour_ago, hour_ago))
+
+    removed = uploads.remove_stale_uploads(
+        datetime.now() - timedelta(minutes=30), keep={"live"}
+    )
+    assert removed == 1
+    assert sorted(path.name for path in upload_dir.iterdir()) == [
+        "live.part",
+        "recent.part",
+    ]
@@ -1,6 +1,7 @@
 import io
 import json
 
+import numpy as np
 import pytest
 from fastapi import HTTPException
 from geoalchemy2.shape import from_shape
@@ -8,9 +9,14 @@ from shapely.geometry import LineString, shape
 
 from app.utils import (
     extract_network_info,
+    file_digest,
     geojson_to_road_edges,
+    hilbert_keys,
     load_geojson_file,
+    parse_property_filters,
+    properties_digest,
     road_edges_to_geojson,
+    sort_edges_spatially,
 )
 
 
@@ -106,3 +112,83 @@ def test_road_edges_to_geojson():
     feature = geojson["features"][0]
     assert feature["geometry"]["type"] == "LineString"
     assert feature["properties"]["name"] == "Test Road"
+
+
+def test_properties_digest_ignores_key_order():
+    assert properties_digest({"highway": "primary", "lanes": 2}) == properties_digest(
+        {"lanes": 2, "highway": "primary"}
+    )
+    assert properties_digest({"lanes": 2}) != properties_digest({"lanes": 3})
+
+
+def test_geojson_to_road_edges_shares_equal_properties():
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[0, 0], [1, 1]]},
+    }
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {**feature, "properties": {"highway": "primary"}},
+            {**feature, "properties": {"highway": "primary"}},
+        ],
+    }
+    edges = geojson_to_road_edges(geojson, 1)
+    assert edges[0]["property_set_id"] == edges[1]["property_set_id"]
+    assert edges[0]["properties"] is edges[1]["properties"]
+
+
+def test_file_digest_rewinds_file():
+    file = io.BytesIO(b'{"type": "FeatureCollection", "features": []}')
+    digest = file_digest(file)
+    assert digest == file_digest(io.BytesIO(file.getvalue()))
+    assert len(digest) == 64
+    assert load_geojson_file(file) == {"type": "FeatureCollection", "features": []}
+
+
+def test_parse_property_filters():
+    filters = parse_property_filters(
+        ["highway:motorway,primary", "maxspeed:50", "highway:trunk"]
+    )
+    assert filters == {
+        "highway": ["motorway", "primary", "trunk"],
+        "maxspeed": ["50", 50],
+    }
+
+
+def test_parse_property_filters_non_finite_numbers():
+    filters = parse_property_filters(["maxspeed:NaN,Infinity,-Infinity,1e999"])
+    assert filters == {"maxspeed": ["NaN", "Infinity", "-Infinity", "1e999"]}
+
+
+@pytest.mark.parametrize("item", ["highway", "highway:", ":motorway"])
+def test_parse_property_filters_invalid(item):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_property_filters([item])
+    assert exc_info.value.status_code == 400
+
+
+def test_hilbert_keys_visit_neighbouring_cells():
+    x, y = np.meshgrid(np.arange(8), np.arange(8))
+    keys = hilbert_keys(x.ravel(), y.ravel(), order=3)
+    assert sorted(keys.tolist()) == list(range(64))
+    cells = np.column_stack([x.ravel(), y.ravel()])[np.argsort(keys)]
+    steps = np.abs(np.diff(cells, axis=0)).sum(axis=1)
+    assert (steps == 1).all()
+
+
+def test_sort_edges_spatially():
+    coordinates = [[[0, 0], [1, 1]], [[50, 50], [51, 51]], [[1, 1], [2, 2]]]
+    geojson_data = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"index": index},
+                "geometry": {"type": "LineString", "coordinates": line},
+            }
+            for index, line in enumerate(coordinates)
+        ],
+    }
+    edges = sort_edges_spatially(geojson_to_road_edges(geojson_data, 1))
+    assert [edge["properties"]["index"] for edge in edges] == [0, 2, 1]